@@ -0,0 +1,57 @@
+''' Compares the forward and adjoint runtimes of the steady Orkney problem for different numbers of assembly threads.
+    Run it on a single process, e.g. python sw_threads.py 1 2 4 8 '''
+import sys
+from opentidalfarm import *
+set_log_level(ERROR)
+
+# Some domain information extracted from the geo file
+site_x = 1000.
+site_y = 500.
+site_x_start = 1.03068e+07
+site_y_start = 6.52246e+06 - site_y
+
+inflow_x = 8400.
+inflow_y = -1390.
+inflow_norm = (inflow_x**2 + inflow_y**2)**0.5
+inflow_direction = [inflow_x/inflow_norm, inflow_y/inflow_norm]
+
+config = SteadyConfiguration("mesh/earth_orkney_converted.xml", inflow_direction=inflow_direction)
+config.set_site_dimensions(site_x_start, site_x_start + site_x, site_y_start, site_y_start + site_y)
+config.params['diffusion_coef'] = 90.0
+config.params["turbine_x"] = 40.
+config.params["turbine_y"] = 40.
+config.params["dump_period"] = 0
+config.params["output_turbine_power"] = False
+
+# Place some turbines
+deploy_turbines(config, nx=8, ny=4)
+config.params["turbine_friction"] = 0.5*numpy.array(config.params["turbine_friction"])
+
+rf = ReducedFunctional(config)
+m0 = rf.initial_control()
+
+thread_counts = [int(n) for n in sys.argv[1:]] or [1, 2, 4]
+timings = []
+for num_threads in thread_counts:
+    config.params["num_threads"] = num_threads
+
+    # Warm up the form compiler and the solver caches. The memoisation of the reduced functional is bypassed.
+    rf.compute_functional_mem.fn(m0)
+
+    # Start the timed run from the same cold initial guess as the warm-up, not from its converged state
+    rf.last_state = None
+    t = Timer("Forward model")
+    j = rf.compute_functional_mem.fn(m0)
+    time_forward = t.stop()
+
+    t = Timer("Adjoint model")
+    rf.compute_gradient_mem.fn(m0, forget=True)
+    time_adjoint = t.stop()
+
+    timings.append((num_threads, time_forward, time_adjoint))
+    print0("Threads: %i, forward model runtime: %f s, adjoint model runtime: %f s, functional: %f" % (num_threads, time_forward, time_adjoint, j))
+
+print0("\nThreads | Forward (s) | Adjoint (s) | Speed-up")
+for num_threads, time_forward, time_adjoint in timings:
+    speedup = (timings[0][1] + timings[0][2]) / (time_forward + time_adjoint)
+    print0("%7i | %11.3f | %11.3f | %8.2f" % (num_threads, time_forward, time_adjoint, speedup))
@@ -17,6 +17,8 @@ config.functional = PowerCurveFunctional
 config.params['turbine_thrust_parametrisation'] = True
 config.params['initial_condition'] = ConstantFlowInitialCondition(config)
 config.params['automatic_scaling'] = False
+# Plot the applied thrust force against the expected thrust force
+config.params['observers'] = [ThrustPlotObserver(config)]
 #config.params['diffusion_coef'] = 10.
 
 # Place one turbine 
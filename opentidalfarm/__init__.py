@@ -15,15 +15,23 @@ import finite_elements
 import helpers
 import shallow_water_model
 import mini_model
+import explicit_model
+import harmonic_balance
 import initial_conditions
 from configuration import *
 
 from optimisation_helpers import friction_constraints, get_minimum_distance_constraint_func, get_domain_constraints, merge_constraints, deploy_turbines, position_constraints, generate_site_constraints, plot_site_constraints, get_distance_function
 from reduced_functional import ReducedFunctional
+from multi_steady_state import MultiSteadyReducedFunctional
+from ensemble import EnsembleReducedFunctional
+from spin_up_state import spin_up, save_spin_up_state, load_spin_up_state
 from dirichlet_bc import DirichletBCSet
 from initial_conditions import SinusoidalInitialCondition, BumpInitialCondition
 from turbines import Turbines
 from functionals import DefaultFunctional, PowerCurveFunctional
+from observers import Observer, ThrustPlotObserver
+from parareal import Parareal
+from reduced_order_model import PODSurrogate
 
 from dolfin import *
 from dolfin_adjoint import minimize, maximize, Function
@@ -3,6 +3,8 @@ import numpy
 from parameter_dict import ParameterDictionary
 from dirichlet_bc import DirichletBCSet
 from turbines import TurbineCache
+from solvers import SolverCache
+from state_cache import StateCache
 from dolfin import *
 from math import sqrt, pi
 from initial_conditions import *
@@ -27,6 +29,27 @@ class DefaultConfiguration(object):
             'steady_state': False,
             'functional_final_time_only': False,
             'functional_quadrature_degree': 1,
+            'imex': False,
+            'imex_explicit_friction': True,
+            'adaptive_timestepping': False,
+            'explicit_ssprk_order': 3,
+            'harmonic_balance_harmonics': 2,
+            'multi_steady_processes': 0,
+            'spin_up_file': None,
+            'forward_checkpoint_period': 0,
+            'forward_checkpoint_file': 'forward_checkpoint',
+            'resume_from_forward_checkpoint': False,
+            'pod_training_runs': 3,
+            'pod_tolerance': 1e-8,
+            'pod_max_modes': 40,
+            'parareal_slices': 4,
+            'parareal_coarse_dt': None,
+            'parareal_tolerance': 1e-6,
+            'parareal_processes': 0,
+            'explicit_cfl': 0.3,
+            'adaptive_timestepping_tolerance': 1e-4,
+            'dt_min': None,
+            'dt_max': None,
             'bctype': 'flather',
             'strong_bc': None,
             'flather_bc_expr': None,
@@ -49,13 +72,24 @@ class DefaultConfiguration(object):
             'cost_coef': 0.,
             'turbine_thrust_parametrisation': False,
             'implicit_turbine_thrust_parametrisation': False,
+            'segregated_thrust_solve': False,
+            'segregated_thrust_tolerance': 1e-10,
             'rho': 1000.,  # Use the density of water: 1000kg/m^3
             'controls': ['turbine_pos', 'turbine_friction'],
             'newton_solver': False,
+            'newton_line_search': 'bt',
+            'newton_damped_retries': 3,
+            'initial_guess_extrapolation': 1,
+            'continuation_stages': 0,
+            'continuation_parameter': 'diffusion_coef',
+            'continuation_baseline': False,
+            'mesh_sequence': [],
             'linear_solver': 'mumps',
+            'num_threads': 0,
             'preconditioner': 'default',
             'picard_relative_tolerance': 1e-5,
             'picard_iterations': 3,
+            'picard_acceleration': 0,
             'run_benchmark': False,
             'solver_exclude': ['cg'],
             'start_time': 0.,
@@ -66,7 +100,11 @@ class DefaultConfiguration(object):
             'automatic_scaling_multiplier': 5,
             'output_turbine_power': True,
             'save_checkpoints': False,
+            'observers': [],
             'cache_forward_state': False,
+            'cache_forward_state_budget': 1024,
+            'cache_forward_state_precision': 'double',
+            'cache_forward_state_storage': 'memory',
             'base_path': os.curdir
             })
 
@@ -84,6 +122,12 @@ class DefaultConfiguration(object):
         # Create a chaching object for the interpolated turbine friction fields (as their computation is very expensive)
         self.turbine_cache = TurbineCache()
 
+        # Create a caching object for the solvers so that matrix tensors and symbolic factorisations are reused
+        self.solver_cache = SolverCache()
+
+        # Create a caching object for the forward states that are used as initial guesses in the next optimisation iteration
+        self.state_cache = StateCache()
+
         # A counter for the current optimisation iteration
         self.optimisation_iteration = 0
 
@@ -104,6 +148,9 @@ class DefaultConfiguration(object):
         self.function_space = MixedFunctionSpace([V, H])
         self.function_space_enriched = MixedFunctionSpace([V, H, T])
         self.function_space_2enriched = MixedFunctionSpace([V, H, T, T])
+        # The function spaces of the upstream velocities in the segregated thrust solve
+        self.upstream_function_space = T
+        self.upstream_function_space_implicit = MixedFunctionSpace([T, T])
 
     def set_turbine_pos(self, positions, friction=21.0):
         ''' Sets the turbine position and a equal friction parameter. '''
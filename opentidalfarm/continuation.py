@@ -0,0 +1,107 @@
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue, info_green, info_red
+
+
+class SteadyStateContinuation(object):
+    ''' Computes the initial guess for a cold-started steady state solve with parameter continuation.
+        The problem is solved in a few warm-started stages that ramp a parameter from an easy problem
+        to the target problem. Valid continuation parameters are:
+          "diffusion_coef": starts with 2**stages times the target diffusion and halves it in each stage,
+          "inflow": ramps the magnitude of the constant inflow boundary conditions linearly from zero,
+          "turbine_friction": ramps the turbine friction linearly from zero.
+        If params["continuation_baseline"] is True, the target problem is also solved without continuation to
+        report the number of Newton iterations that the continuation saves. '''
+
+    def __init__(self, config, forward_model):
+        self.config = config
+        self.forward_model = forward_model
+        # The Newton iterations of the continuation stages of the most recent solve
+        self.stage_iterations = []
+        self.iterations_before_target = None
+        # The Newton iterations of the target problem without continuation, if params["continuation_baseline"] is True
+        self.baseline_iterations = None
+
+    def stage_parameters(self, stage, stages, turbine_field):
+        ''' Sets the parameters for the given stage and returns the turbine field to be used. '''
+        params = self.config.params
+        parameter = params["continuation_parameter"]
+        alpha = float(stage) / (stages + 1)
+
+        if parameter == "diffusion_coef":
+            params["diffusion_coef"] = Constant(2 ** (stages - stage + 1)) * self.diffusion_coef
+        elif parameter == "inflow":
+            if params["bctype"] != "strong_dirichlet":
+                raise ValueError("Inflow continuation requires constant flow strong Dirichlet boundary conditions.")
+            params["strong_bc"].scale_constant_flow(alpha)
+        elif parameter == "turbine_friction":
+            tf = Function(turbine_field.function_space(), name="turbine_friction_continuation")
+            tf.vector().axpy(alpha, turbine_field.vector())
+            return tf
+        else:
+            raise ValueError("Unknown continuation parameter: %s" % parameter)
+
+        return turbine_field
+
+    def baseline(self, state, turbine_field):
+        ''' Returns the Newton iterations of the target problem, cold-started from state without continuation,
+            or None if the Newton solver does not converge. '''
+        config = self.config
+        info_blue("Solving the target problem without continuation for comparison.")
+        cold_state = Function(state, annotate=False)
+        iterations = config.solver_cache.newton_iterations()
+        try:
+            self.forward_model(config, cold_state, turbine_field=turbine_field, annotate=False)
+        except RuntimeError:
+            info_red("The target problem did not converge without continuation.")
+            return None
+        return config.solver_cache.newton_iterations() - iterations
+
+    def __call__(self, state, turbine_field):
+        ''' Solves the continuation stages. On exit, state contains the solution of the last stage,
+            which is the initial guess for the target problem. '''
+        config = self.config
+        params = config.params
+        stages = params["continuation_stages"]
+        if params["continuation_parameter"] == "diffusion_coef" and not params["include_diffusion"]:
+            raise ValueError("Diffusion continuation requires include_diffusion=True.")
+
+        # Store the parameters that are modified by the continuation stages
+        self.diffusion_coef = params["diffusion_coef"]
+        dump_period = params["dump_period"]
+        print_individual_turbine_power = params["print_individual_turbine_power"]
+        observers = params["observers"]
+        params["dump_period"] = 0
+        params["print_individual_turbine_power"] = False
+        params["observers"] = []
+
+        self.stage_iterations = []
+        self.baseline_iterations = None
+        try:
+            if params["continuation_baseline"]:
+                self.baseline_iterations = self.baseline(state, turbine_field)
+            for stage in range(1, stages + 1):
+                info_blue("Solving continuation stage %i of %i for parameter '%s'." % (stage, stages, params["continuation_parameter"]))
+                tf = self.stage_parameters(stage, stages, turbine_field)
+                iterations = config.solver_cache.newton_iterations()
+                self.forward_model(config, state, turbine_field=tf, annotate=False)
+                self.stage_iterations.append(config.solver_cache.newton_iterations() - iterations)
+
+        finally:
+            # Restore the target problem
+            params["diffusion_coef"] = self.diffusion_coef
+            params["dump_period"] = dump_period
+            params["print_individual_turbine_power"] = print_individual_turbine_power
+            params["observers"] = observers
+            if params["bctype"] == "strong_dirichlet":
+                params["strong_bc"].scale_constant_flow(1.0)
+
+        self.iterations_before_target = config.solver_cache.newton_iterations()
+
+    def report(self):
+        ''' Reports the Newton iterations of the most recent continuation solve. Must be called after the target problem was solved. '''
+        target_iterations = self.config.solver_cache.newton_iterations() - self.iterations_before_target
+        total_iterations = sum(self.stage_iterations) + target_iterations
+        info_green("Continuation needed %i Newton iterations in total: %s in the continuation stages and %i for the target problem." % (total_iterations, " + ".join([str(i) for i in self.stage_iterations]), target_iterations))
+        if self.baseline_iterations is not None:
+            info_green("Without continuation the target problem needed %i Newton iterations; the continuation saved %i." % (self.baseline_iterations, self.baseline_iterations - total_iterations))
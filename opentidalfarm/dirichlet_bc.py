@@ -16,6 +16,7 @@ class DirichletBCSet:
 
         self.expressions = []
         self.constant_inflow_bcs = []
+        self.constant_inflow_values = []
 
         self.bcs = []
 
@@ -26,6 +27,12 @@ class DirichletBCSet:
         for bc in self.constant_inflow_bcs:
             bc.t = t
 
+    def scale_constant_flow(self, factor):
+        ''' Scales the magnitude of all constant inflow boundary conditions relative to the values they were created with. '''
+        for bc, (ux, uy) in zip(self.constant_inflow_bcs, self.constant_inflow_values):
+            bc.ux = factor * ux
+            bc.uy = factor * uy
+
     def add_analytic_u(self, label, expression):
         if self.config.params['steady_state']:
             raise ValueError('Can not apply a time dependent boundary condition for a steady state simulation.')
@@ -35,6 +42,7 @@ class DirichletBCSet:
 
     def add_constant_flow(self, label, magnitude, direction=[1, 0]):
         norm = sqrt(direction[0] ** 2 + direction[1] ** 2)
+        self.constant_inflow_values.append((direction[0] * magnitude / norm, direction[1] * magnitude / norm))
         self.constant_inflow_bcs.append(Expression(("ux", "uy"), ux=direction[0] * magnitude / norm, uy=direction[1] * magnitude / norm))
         self.bcs.append(DirichletBC(self.function_space.sub(0), self.constant_inflow_bcs[-1], self.config.domain.boundaries, label))
 
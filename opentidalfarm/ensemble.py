@@ -0,0 +1,69 @@
+import shallow_water_model as sw_model
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue
+from reduced_functional import ReducedFunctional
+from parallel_reduced_functional import ParallelReducedFunctional
+
+
+def state_function_space(config):
+    ''' Returns the function space of the state of the configuration. '''
+    params = config.params
+    if params["implicit_turbine_thrust_parametrisation"]:
+        return config.function_space_2enriched
+    elif params["turbine_thrust_parametrisation"]:
+        return config.function_space_enriched
+    else:
+        return config.function_space
+
+
+class EnsembleReducedFunctional(ParallelReducedFunctional):
+    ''' A reduced functional for a farm design over an ensemble of flow scenarios (for example flood and ebb or
+        spring and neap tides). Each scenario has its own configuration, and all configurations must share the
+        mesh and the turbine controls. The functional is the weighted sum sum_i weights[i] * j_i of the scenario
+        functionals, and the scenarios are evaluated concurrently in the given number of worker processes
+        (0 for the number of CPUs) that are forked from the current process. In parallel (MPI) runs, the
+        scenarios are evaluated one after another.
+        The first configuration controls the output of the ensemble (turbine files, checkpoints, scaling).
+        The scenario configurations should have different base_path values if they dump their states. '''
+
+    def __init__(self, configs, weights=None, processes=0, scale=1.0, forward_model=sw_model.sw_solve, plot=False, save_functional_values=False):
+        if len(configs) == 0:
+            raise ValueError("The ensemble needs at least one configuration.")
+        if weights is None:
+            weights = [1.0] * len(configs)
+        if len(weights) != len(configs):
+            raise ValueError("The ensemble needs one weight per configuration.")
+        super(EnsembleReducedFunctional, self).__init__(configs[0], weights, processes, scale, forward_model, plot, save_functional_values)
+
+        self.configs = configs
+        # The scenarios are evaluated with the reduced functionals of their configurations
+        self.scenarios = [ReducedFunctional(config, forward_model=forward_model) for config in configs]
+
+        params = configs[0].params
+        for config in configs[1:]:
+            for key in ["turbine_parametrisation", "controls"]:
+                if config.params[key] != params[key]:
+                    raise ValueError("The ensemble configurations must have the same %s." % key)
+            if config.function_space.dim() != configs[0].function_space.dim():
+                raise ValueError("The ensemble configurations must share the mesh and the finite element.")
+        if len(set([len(scenario.initial_control()) for scenario in self.scenarios])) > 1:
+            raise ValueError("The ensemble configurations must share the turbine layout.")
+        if "dynamic_turbine_friction" in params["controls"]:
+            raise NotImplementedError("The ensemble reduced functional does not support a dynamic turbine friction control.")
+
+    def solve(self, i, m, gradient):
+        ''' Solves scenario i. Returns its functional value, its gradient if gradient is True, and its final state vector. '''
+        info_blue("Solving scenario %i of %i." % (i + 1, len(self.scenarios)))
+        scenario = self.scenarios[i]
+        j = scenario.compute_functional_mem.fn(m, annotate=gradient)
+        dj = scenario.compute_gradient_mem.fn(m, forget=True) if gradient else None
+        return j, dj, scenario.last_state.vector().array()
+
+    def keep_state(self, i, x):
+        ''' Keeps the final state of scenario i as the initial guess of its next steady state solve. '''
+        scenario = self.scenarios[i]
+        if scenario.last_state is None:
+            scenario.last_state = Function(state_function_space(self.configs[i]), name="Current_state")
+        scenario.last_state.vector().set_local(x)
+        scenario.last_state.vector().apply("insert")
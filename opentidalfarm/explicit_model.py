@@ -0,0 +1,218 @@
+import math
+import numpy
+import dolfin
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info, info_blue, info_red, print0, StateWriter, with_assembly_threads
+from observers import observer_list, finalize_observers
+from solvers import PrecompiledForm
+from shallow_water_model import spatial_residual
+
+# The Shu-Osher form of the strong stability preserving Runge-Kutta schemes. Each stage computes
+# w_k = a * w_0 + b * (w_(k-1) + dt * L(w_(k-1))), where c_in and c_out are the relative times of w_(k-1) and w_k.
+ssprk_stages = {1: [(0., 1., 0., 1.)],
+                2: [(0., 1., 0., 1.), (0.5, 0.5, 1., 1.)],
+                3: [(0., 1., 0., 1.), (0.75, 0.25, 1., 0.5), (1. / 3, 2. / 3, 0.5, 1.)]}
+
+
+def lumped_dx():
+    ''' Returns the measure of the vertex quadrature. For degree 1 Lagrange elements, the mass matrix assembled
+        with this measure is the row-sum lumped mass matrix. '''
+    return dx(metadata={"quadrature_degree": 1, "quadrature_rule": "vertex"})
+
+
+def check_lumpable(element):
+    ''' Raises a ValueError if the mass matrix of the element can not be lumped with the vertex quadrature. '''
+    if element.num_sub_elements() > 0:
+        for sub_element in element.sub_elements():
+            check_lumpable(sub_element)
+    elif element.family() not in ("Lagrange", "Discontinuous Lagrange") or element.degree() > 1:
+        raise ValueError("The explicit model requires Lagrange elements of degree 0 or 1 (for example finite_elements.p1dgp1), but got %s." % str(element))
+
+
+def max_velocity(state):
+    ''' Returns the maximum absolute value of the velocity components of state. '''
+    V = state.function_space()
+    dofs = numpy.array(V.sub(0).dofmap().dofs())
+    x = state.vector().array()
+    offset = state.vector().local_range()[0]
+    return MPI.max(float(numpy.abs(x[dofs - offset]).max()) if len(dofs) > 0 else 0.)
+
+
+def cfl_number(config, state, dt):
+    ''' Returns the CFL number of the timestep dt with the gravity wave speed and the maximum velocity of state. '''
+    params = config.params
+    h_min = MPI.min(state.function_space().mesh().hmin())
+    return dt * (math.sqrt(params["g"] * params["depth"]) + max_velocity(state)) / h_min
+
+
+def cfl_timestep(config, state):
+    ''' Returns the largest timestep that satisfies the CFL condition with the gravity wave speed and the
+        maximum velocity of state. The timestep is reduced such that it divides the simulation time into equal steps. '''
+    params = config.params
+    dt = params["explicit_cfl"] / cfl_number(config, state, 1.0)
+    duration = params["finish_time"] - params["start_time"]
+    return duration / math.ceil(duration / dt)
+
+
+@with_assembly_threads
+def ssprk_solve(config, state, turbine_field=None, functional=None, annotate=True, u_source=None):
+    ''' Solves the unsteady shallow water equations with an explicit strong stability preserving Runge-Kutta scheme
+        of order params["explicit_ssprk_order"] and a lumped mass matrix. It can be used as the forward_model of the
+        ReducedFunctional. If params["explicit_cfl"] is positive, the timestep is computed from the CFL condition with
+        the initial state and stored in params["dt"]. A warning is printed if the velocity grows such that the CFL
+        number exceeds params["explicit_cfl"] later in the run.
+        Each stage is a diagonal solve that is computed without annotation and then recorded as a
+        variational problem with the lumped mass, so that dolfin-adjoint derives the adjoint of the explicit scheme. '''
+
+    params = config.params
+    params.check()
+
+    if params["steady_state"] or not params["include_time_term"]:
+        raise ValueError("The explicit model can only solve unsteady problems.")
+    if params["turbine_thrust_parametrisation"] or params["implicit_turbine_thrust_parametrisation"]:
+        raise NotImplementedError("The explicit model does not support the thrust turbine parametrisations.")
+    if "dynamic_turbine_friction" in params["controls"]:
+        raise NotImplementedError("The explicit model does not support a dynamic turbine friction control.")
+    if params["explicit_ssprk_order"] not in ssprk_stages:
+        raise ValueError("explicit_ssprk_order must be one of %s." % ", ".join([str(k) for k in ssprk_stages.keys()]))
+    if not 0 <= params["functional_quadrature_degree"] <= 1:
+        raise ValueError("functional_quadrature_degree must be 0 or 1.")
+
+    function_space = config.function_space
+    check_lumpable(function_space.ufl_element())
+    functional_final_time_only = params["functional_final_time_only"]
+    functional_quadrature_degree = params["functional_quadrature_degree"]
+    bctype = params["bctype"]
+    strong_bc = params["strong_bc"]
+    bcs = strong_bc.bcs if bctype == 'strong_dirichlet' else []
+
+    # Reset the time
+    params["current_time"] = params["start_time"]
+    t = params["current_time"]
+
+    if params["explicit_cfl"] > 0:
+        params["dt"] = cfl_timestep(config, state)
+        info("Explicit model: using the CFL timestep %g." % params["dt"])
+    dt = params["dt"]
+
+    if turbine_field:
+        tf = Function(turbine_field, name="turbine_friction", annotate=annotate)
+    else:
+        tf = None
+
+    # The inverse of the lumped mass matrix
+    w_test = TestFunction(function_space)
+    ones = dolfin.Function(function_space)
+    ones.vector()[:] = 1.0
+    m_inv = 1. / dolfin.assemble(inner(ones, w_test) * lumped_dx()).array()
+
+    # Set up the stages. The residual of each stage is compiled once.
+    stages = []
+    w_prev = state
+    for k, (a, b, c_in, c_out) in enumerate(ssprk_stages[params["explicit_ssprk_order"]]):
+        w = Function(function_space, name="SSPRK_stage_%i" % k)
+        u, h = split(w_prev)
+        v, q = split(w_test)
+        R = PrecompiledForm(spatial_residual(config, u, h, v, q, tf, u_source))
+        # The stage written as a variational problem with the lumped mass, used to record the stage for the adjoint
+        F = inner(w - a * state - b * w_prev, w_test) * lumped_dx() + b * dt * R.ufl_form
+        recorder = config.solver_cache.newton_solver("ssprk_stage_%i" % k, function_space, "default", "default")
+        stages.append((a, b, c_in, c_out, w_prev, w, R, F, recorder))
+        w_prev = w
+
+    def update_time(t):
+        ''' Updates the boundary conditions and the source term to time t. '''
+        if bctype == 'strong_dirichlet':
+            strong_bc.update_time(t)
+        elif bctype == 'dirichlet':
+            params["weak_dirichlet_bc_expr"].t = t
+        else:
+            params["flather_bc_expr"].t = t
+        if u_source:
+            u_source.t = t
+
+    if params["dump_period"] > 0:
+        try:
+            statewriter_cb = config.statewriter_callback
+        except AttributeError:
+            statewriter_cb = None
+        writer = StateWriter(config, optimisation_iteration=config.optimisation_iteration, callback=statewriter_cb)
+        print0("Writing state to disk...")
+        writer.write(state)
+
+    if functional is not None:
+        Jt_form = PrecompiledForm(functional.Jt(state, tf))
+        if functional_final_time_only:
+            j = 0.
+        else:
+            quad = 0.5 if functional_quadrature_degree == 1 else 0.
+            j = dt * quad * Jt_form.assemble()
+
+    observers = observer_list(params["observers"])
+
+    print0("Start of time loop")
+    # The observers are finalized also if a solve fails, so that their background threads do not outlive the run
+    time_loop_failed = True
+    try:
+        adjointer.time.start(t)
+        timestep = 0
+        state_new = state
+        cfl_warned = False
+        while (t < params["finish_time"]):
+            timestep += 1
+            info_blue("Solving shallow water equations at time %s (SSPRK%i) ..." % (t + dt, params["explicit_ssprk_order"]))
+
+            for (a, b, c_in, c_out, w_prev, w, R, F, recorder) in stages:
+                # The residual is evaluated at the time of the previous stage and the strong boundary conditions at the time of the new stage
+                update_time(t + c_in * dt)
+                r = R.assemble().array()
+                x = a * state.vector().array() + b * (w_prev.vector().array() - dt * m_inv * r)
+                w.vector().set_local(x)
+                w.vector().apply("insert")
+                if bctype == 'strong_dirichlet':
+                    strong_bc.update_time(t + c_out * dt)
+                    for bc in bcs:
+                        bc.apply(w.vector())
+                if annotate:
+                    recorder.record(F, w, bcs=bcs)
+                state_new = w
+
+            t += dt
+            params["current_time"] = t
+            update_time(t)
+            state.assign(state_new, annotate=annotate)
+
+            for observer in observers:
+                observer.notify(timestep, t, state, tf)
+
+            # The timestep is kept fixed, since the stages are recorded for the adjoint with the initial timestep
+            if params["explicit_cfl"] > 0 and not cfl_warned:
+                cfl = cfl_number(config, state, dt)
+                if cfl > params["explicit_cfl"]:
+                    info_red("Explicit model: the CFL number %g at time %s exceeds explicit_cfl = %g, since the velocity has grown since the start of the run. The solution may become unstable." % (cfl, t, params["explicit_cfl"]))
+                    cfl_warned = True
+
+            if params["dump_period"] > 0 and timestep % params["dump_period"] == 0:
+                print0("Write state to disk...")
+                writer.write(state)
+
+            if functional is not None:
+                if not (functional_final_time_only and t < params["finish_time"]):
+                    if functional_final_time_only or functional_quadrature_degree == 0:
+                        quad = 1.0
+                    elif t >= params["finish_time"]:
+                        quad = 0.5 * dt
+                    else:
+                        quad = 1.0 * dt
+                    j += quad * Jt_form.assemble()
+
+            # Increase the adjoint timestep
+            adj_inc_timestep(time=t, finished=(not t < params["finish_time"]))
+        time_loop_failed = False
+    finally:
+        finalize_observers(observers, ignore_errors=time_loop_failed)
+    print0("End of time loop.")
+
+    if functional is not None:
+        return j
@@ -31,6 +31,16 @@ def p1dgp2(mesh):
     return V, H
 
 
+def p1dgp1(mesh):
+    "Return a function space U*H on mesh from the p1dgp1 space. Its mass matrix can be lumped."
+
+    V = VectorFunctionSpace(mesh, 'DG', 1, dim=2)  # Velocity space
+
+    H = FunctionSpace(mesh, 'CG', 1)               # Height space
+
+    return V, H
+
+
 def bdfmp1dg(mesh):
     "Return a function space U*H on mesh from the BFDM1 space."
 
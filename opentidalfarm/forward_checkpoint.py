@@ -0,0 +1,39 @@
+import os
+import numpy
+from dolfin import *
+from helpers import info_blue
+
+
+def checkpoint_filename(config):
+    ''' Returns the name of the checkpoint file of this process. '''
+    params = config.params
+    return os.path.join(params["base_path"], "%s_%i.npz" % (params["forward_checkpoint_file"], MPI.process_number()))
+
+
+def save_forward_checkpoint(config, state, **values):
+    ''' Saves the local part of the state vector and the scalar values of the time loop of this process to a binary
+        checkpoint file. The file is replaced atomically, so that a run that is killed while writing keeps its
+        previous checkpoint. '''
+    filename = checkpoint_filename(config)
+    tmp_filename = filename[:-len(".npz")] + "_tmp.npz"
+    numpy.savez(tmp_filename, state=state.vector().array(), num_processes=MPI.num_processes(), **values)
+    os.rename(tmp_filename, filename)
+    info_blue("Saved the forward checkpoint at time %s." % values["t"])
+
+
+def load_forward_checkpoint(config, state):
+    ''' Loads the most recent checkpoint of this process into state and returns a dictionary with the scalar values of
+        the time loop. '''
+    filename = checkpoint_filename(config)
+    if not os.path.isfile(filename):
+        raise IOError("The forward checkpoint %s does not exist." % filename)
+    data = numpy.load(filename)
+    if int(data["num_processes"]) != MPI.num_processes() or len(data["state"]) != len(state.vector().array()):
+        raise ValueError("The forward checkpoint %s was saved with a different mesh partition." % filename)
+
+    state.vector().set_local(data["state"])
+    state.vector().apply("insert")
+    values = dict((key, data[key][()]) for key in data.files if key not in ("state", "num_processes"))
+    data.close()
+    info_blue("Resuming from the forward checkpoint at time %s." % values["t"])
+    return values
@@ -1,5 +1,6 @@
 from turbines import *
 from parameter_dict import ParameterDictionary
+from solvers import PrecompiledForm
 import shallow_water_model
 
 
@@ -55,6 +56,50 @@ class DefaultFunctional(FunctionalPrototype):
         return (self.force(state, tf) - self.cost_per_friction(tf)) * self.config.site_dx(1)
 
 
+class IndividualTurbineContributions(object):
+    ''' Computes the power and force of all individual turbines of a DefaultFunctional.
+        Since the power and force are linear in the turbine field, the contribution of a turbine is the inner product
+        of its turbine field with the assembled power (or force) density, plus the contribution of a zero turbine field.
+        Hence each timestep needs one vector assembly per quantity, followed by a sparse reduction over the turbine footprints. '''
+
+    def __init__(self, functional, state):
+        config = functional.config
+        turbine_fields = config.turbine_cache.cache['turbine_field_individual']
+        tf = Function(config.turbine_function_space, annotate=False)
+        zero = Constant(0)
+
+        self.power_density = PrecompiledForm(derivative(functional.power(state, tf) * config.site_dx(1), tf))
+        self.power_offset = PrecompiledForm(functional.power(state, zero) * config.site_dx(1))
+        self.force_density = PrecompiledForm(derivative(functional.force(state, tf) * config.site_dx(1), tf))
+        self.force_offset = PrecompiledForm(functional.force(state, zero) * config.site_dx(1))
+
+        # The footprint of each turbine: the local indices and values of the nonzero entries of its turbine field
+        self.weights = []
+        for turbine_field in turbine_fields:
+            x = turbine_field.vector().array()
+            indices = numpy.nonzero(x)[0]
+            self.weights.append((indices, x[indices]))
+
+        # The costs do not depend on the state and are computed once
+        if functional.params['cost_coef'] > 0:
+            self.costs = [assemble(functional.cost_per_friction(turbine_field) * config.site_dx(1), annotate=False) for turbine_field in turbine_fields]
+        else:
+            self.costs = [0.] * len(turbine_fields)
+
+    def reduce(self, density, offset):
+        b = density.assemble().array()
+        c = offset.assemble()
+        return [MPI.sum(numpy.dot(values, b[indices])) + c - cost for (indices, values), cost in zip(self.weights, self.costs)]
+
+    def power(self):
+        ''' Returns the list of the power contributions of the individual turbines for the current state. '''
+        return self.reduce(self.power_density, self.power_offset)
+
+    def force(self):
+        ''' Returns the list of the forces on the individual turbines for the current state. '''
+        return self.reduce(self.force_density, self.force_offset)
+
+
 class PowerCurveFunctional(FunctionalPrototype):
     ''' Implements a functional for the power with a given power curve
           J(u, m) = \int_\Omega power(u)
@@ -0,0 +1,172 @@
+import math
+import numpy
+import dolfin
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue, print0, with_assembly_threads
+from shallow_water_model import spatial_residual
+
+
+def spectral_differentiation_matrix(N, period):
+    ''' Returns the Fourier spectral differentiation matrix for N (odd) equidistant time levels of a periodic
+        function with the given period. '''
+    D = numpy.zeros((N, N))
+    for i in range(N):
+        for j in range(N):
+            if i != j:
+                D[i, j] = math.pi / period * (-1) ** (i - j) / math.sin(math.pi * (i - j) / N)
+    return D
+
+
+def time_level_bc(bc, W, i, t):
+    ''' Returns the strong boundary condition bc of the state space at time t on the space of time level i. '''
+    if not isinstance(bc, dolfin.DirichletBC):
+        raise NotImplementedError("The harmonic balance solver only supports Dirichlet boundary conditions.")
+    component = list(bc.function_space().component())
+    V = W.sub(2 * i + component[0])
+    for c in component[1:]:
+        V = V.sub(c)
+    # Freeze the boundary value at time t
+    value = dolfin.Function(V.collapse())
+    value.interpolate(bc.value())
+    return DirichletBC(V, value, *bc.domain_args, method=bc.method())
+
+
+@with_assembly_threads
+def hb_solve(config, state, turbine_field=None, functional=None, annotate=True, u_source=None):
+    ''' Solves for the periodic solution of the shallow water equations with the period
+        params["finish_time"] - params["start_time"] with the harmonic balance (time spectral) method.
+        The solution is represented by its values at N = 2 * params["harmonic_balance_harmonics"] + 1 equidistant
+        time levels, which is equivalent to a Fourier series with that many harmonics. The time derivative is the
+        spectral derivative of the series, and all time levels are solved at once with a Newton solve.
+        The boundary conditions and source term must be periodic with the period.
+
+        It can be used as the forward_model of the ReducedFunctional. For the functional and the adjoint,
+        the time levels are copied into state in a sequence of timesteps, such that the time integral of
+        the functional is the (spectrally accurate) trapezoidal rule over the period. '''
+
+    params = config.params
+    params.check()
+
+    if params["steady_state"] or not params["include_time_term"]:
+        raise ValueError("The harmonic balance solver requires an unsteady problem.")
+    if params["turbine_thrust_parametrisation"] or params["implicit_turbine_thrust_parametrisation"]:
+        raise NotImplementedError("The harmonic balance solver does not support the thrust turbine parametrisations.")
+    if "dynamic_turbine_friction" in params["controls"]:
+        raise NotImplementedError("The harmonic balance solver does not support a dynamic turbine friction control.")
+    if params["functional_quadrature_degree"] == 0 and not params["functional_final_time_only"]:
+        raise NotImplementedError("The harmonic balance solver requires functional_quadrature_degree=1 or functional_final_time_only=True.")
+    if not hasattr(dolfin, "FunctionAssigner"):
+        raise NotImplementedError("The harmonic balance solver requires DOLFIN 1.4 or newer.")
+
+    function_space = config.function_space
+    bctype = params["bctype"]
+    N = 2 * params["harmonic_balance_harmonics"] + 1
+    start_time = params["start_time"]
+    period = params["finish_time"] - start_time
+    times = [start_time + i * period / N for i in range(N)]
+    D = spectral_differentiation_matrix(N, period)
+
+    if turbine_field:
+        tf = Function(turbine_field, name="turbine_friction", annotate=annotate)
+    else:
+        tf = None
+
+    # The space of all time levels
+    V, H = function_space.split()
+    V = V.collapse()
+    H = H.collapse()
+    W = MixedFunctionSpace([V, H] * N)
+    w = Function(W, name="Harmonic_balance_state")
+    w_split = split(w)
+    w_test = split(TestFunction(W))
+    us, hs = w_split[0::2], w_split[1::2]
+    vs, qs = w_test[0::2], w_test[1::2]
+
+    F = 0
+    bcs = []
+    for i, t in enumerate(times):
+        # The boundary values and the source term are frozen at the time of the level
+        bc_expr = None
+        if bctype == 'strong_dirichlet':
+            params["strong_bc"].update_time(t)
+            bcs += [time_level_bc(bc, W, i, t) for bc in params["strong_bc"].bcs]
+        else:
+            expr = params["flather_bc_expr"] if bctype == 'flather' else params["weak_dirichlet_bc_expr"]
+            expr.t = t
+            bc_expr = dolfin.Function(V)
+            bc_expr.interpolate(expr)
+        source = None
+        if u_source:
+            u_source.t = t
+            source = dolfin.Function(V)
+            source.interpolate(u_source)
+
+        # The spectral time derivative couples the level to all other levels
+        for j in range(N):
+            if D[i, j] != 0:
+                F += D[i, j] * (inner(vs[i], us[j]) + inner(qs[i], hs[j])) * dx
+        F += spatial_residual(config, us[i], hs[i], vs[i], qs[i], tf, source, bc_expr)
+
+    def assign_level(i, to_levels):
+        ''' Copies state into time level i or vice versa, without annotation. '''
+        for k in range(2):
+            if to_levels:
+                dolfin.FunctionAssigner(W.sub(2 * i + k), function_space.sub(k)).assign(w.sub(2 * i + k), state.sub(k))
+            else:
+                dolfin.FunctionAssigner(function_space.sub(k), W.sub(2 * i + k)).assign(state.sub(k), w.sub(2 * i + k))
+
+    # The initial guess
+    cache_forward_state = params["cache_forward_state"]
+    if cache_forward_state:
+        state_cache = config.state_cache
+        state_cache.update(config)
+    if cache_forward_state and state_cache.load(0, w):
+        print0("Load initial guess from cache.")
+    else:
+        for i in range(N):
+            assign_level(i, True)
+
+    preconditioner = "default" if params["preconditioner"] == "fieldsplit" else params["preconditioner"]
+    solver = config.solver_cache.newton_solver("harmonic_balance", W, params["linear_solver"], preconditioner)
+    solver.parameters["line_search"] = params["newton_line_search"]
+    solver.parameters["maximum_retries"] = params["newton_damped_retries"]
+
+    adjointer.time.start(start_time)
+    info_blue("Solving the harmonic balance equations with %i time levels (Newton iteration) ..." % N)
+    solver.solve(F, w, bcs=bcs, annotate=annotate)
+    if cache_forward_state:
+        state_cache.store(0, w)
+
+    # Copy the time levels into state. The copies are annotated as projections, which are exact.
+    u, h = TrialFunctions(function_space)
+    v, q = TestFunctions(function_space)
+    mass = (inner(v, u) + inner(q, h)) * dx
+
+    def copy_level(i):
+        ''' Copies time level i into state. '''
+        if annotate:
+            solve(mass == (inner(v, us[i]) + inner(q, hs[i])) * dx, state, annotate=True)
+        else:
+            assign_level(i, False)
+
+    if functional is not None:
+        Jt_form = functional.Jt(state, tf)
+        j = 0.
+
+    copy_level(0)
+    for i in range(1, N + 1):
+        # The last timestep closes the period with the first level
+        copy_level(i % N)
+        t = start_time + i * period / N
+        params["current_time"] = t
+        if functional is not None:
+            if params["functional_final_time_only"]:
+                if i == N:
+                    j = assemble(Jt_form, annotate=False)
+            else:
+                j += period / N * assemble(Jt_form, annotate=False)
+        adj_inc_timestep(time=t, finished=(i == N))
+
+    if functional is not None:
+        return j
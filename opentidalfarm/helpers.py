@@ -1,11 +1,14 @@
 from __future__ import print_function
 import random
+import functools
+import multiprocessing
 from dolfin import *
 from dolfin_adjoint import *
 from numpy import dot, inf
 import pylab
 import dolfin
 import os.path
+from contextlib import contextmanager
 
 
 def info_green(*args, **kwargs):
@@ -33,6 +36,63 @@ def print0(*args, **kwargs):
         print(*args, **kwargs)
 
 
+def set_num_threads(config):
+    ''' Enables the multithreaded (mesh-coloured) assembly of DOLFIN with config.params["num_threads"] threads.
+        With num_threads = 0, the DOLFIN setting is left unchanged. '''
+    num_threads = config.params["num_threads"]
+    if num_threads > 0 and parameters["num_threads"] != num_threads:
+        info("Using %i threads for the assembly." % num_threads)
+        parameters["num_threads"] = num_threads
+
+
+@contextmanager
+def assembly_threads(config):
+    ''' Assembles with config.params["num_threads"] threads within the context, and restores the previous DOLFIN
+        setting afterwards. The setting would otherwise be kept by later configurations with num_threads = 0. '''
+    previous = parameters["num_threads"]
+    set_num_threads(config)
+    try:
+        yield
+    finally:
+        parameters["num_threads"] = previous
+
+
+def with_assembly_threads(forward_model):
+    ''' Decorates a forward model, whose first argument is the configuration, to run in the assembly_threads context. '''
+    @functools.wraps(forward_model)
+    def wrapper(config, *args, **kwargs):
+        with assembly_threads(config):
+            return forward_model(config, *args, **kwargs)
+    return wrapper
+
+
+# The function that is evaluated by the worker processes of parallel_map
+_parallel_function = None
+
+
+def _parallel_call(args):
+    return _parallel_function(*args)
+
+
+def parallel_map(function, jobs, processes):
+    ''' Returns [function(*job) for job in jobs], evaluated in up to processes worker processes. The workers are forked
+        from the current process, so function may use dolfin objects, but the jobs and results must be picklable.
+        In parallel (MPI) runs or with a single process, the jobs are evaluated sequentially in the current process. '''
+    processes = min(processes or multiprocessing.cpu_count(), len(jobs))
+    if processes <= 1 or MPI.num_processes() > 1:
+        return [function(*job) for job in jobs]
+
+    global _parallel_function
+    _parallel_function = function
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(_parallel_call, jobs)
+    finally:
+        pool.close()
+        pool.join()
+        _parallel_function = None
+
+
 def test_gradient_array(J, dJ, x, seed=0.01, perturbation_direction=None, plot_file=None):
     '''Checks the correctness of the derivative dJ.
        x must be an array that specifies at which point in the parameter space
@@ -0,0 +1,87 @@
+import dolfin
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue, info_green
+
+
+def transfer(f, V, name=None):
+    ''' Interpolates the function f onto the function space V, which may be defined on a different mesh. '''
+    g = Function(V, name=name, annotate=False)
+    if hasattr(dolfin, "LagrangeInterpolator"):
+        # Supports non-matching meshes in parallel
+        dolfin.LagrangeInterpolator().interpolate(g, f)
+    else:
+        allow_extrapolation = parameters["allow_extrapolation"]
+        parameters["allow_extrapolation"] = True
+        try:
+            g.interpolate(f)
+        finally:
+            parameters["allow_extrapolation"] = allow_extrapolation
+    return g
+
+
+class MeshSequencing(object):
+    ''' Computes the initial guess for a cold-started steady state solve by mesh sequencing.
+        The problem is solved on a hierarchy of coarser configurations, the coarsest first,
+        and each solution is interpolated onto the next level as its initial guess.
+        The coarse configurations are set up by the user with the same model settings as the
+        target configuration and with boundary conditions that are bound to the coarse meshes.
+        The turbine layout is copied from the target configuration. '''
+
+    def __init__(self, config, forward_model):
+        self.config = config
+        self.forward_model = forward_model
+        # The Newton iterations of the coarse levels of the most recent solve
+        self.level_iterations = []
+        self.iterations_before_target = None
+
+    def turbine_field(self, coarse_config, turbine_field):
+        ''' Returns the turbine field of the target problem on the mesh of the coarse configuration. '''
+        coarse_config.params["turbine_pos"] = self.config.params["turbine_pos"]
+        coarse_config.params["turbine_friction"] = self.config.params["turbine_friction"]
+        if self.config.params["turbine_parametrisation"] == "smeared":
+            return transfer(turbine_field, coarse_config.turbine_function_space, name="turbine_friction_coarse")
+        coarse_config.turbine_cache.update(coarse_config)
+        return coarse_config.turbine_cache.cache["turbine_field"]
+
+    def __call__(self, state, turbine_field):
+        ''' Solves the coarse levels. On exit, state contains the interpolation of the finest coarse
+            solution, which is the initial guess for the target problem. '''
+        levels = self.config.params["mesh_sequence"]
+
+        self.level_iterations = []
+        coarse_state = None
+        for level, coarse_config in enumerate(levels):
+            info_blue("Solving mesh sequencing level %i of %i." % (level + 1, len(levels)))
+            dump_period = coarse_config.params["dump_period"]
+            coarse_config.params["dump_period"] = 0
+            try:
+                tf = self.turbine_field(coarse_config, turbine_field)
+                V = self.function_space(coarse_config, state.function_space())
+                if coarse_state is None:
+                    coarse_state = Function(V, name="Coarse_state")
+                    coarse_state.assign(coarse_config.params["initial_condition"], annotate=False)
+                else:
+                    coarse_state = transfer(coarse_state, V, name="Coarse_state")
+
+                iterations = coarse_config.solver_cache.newton_iterations()
+                self.forward_model(coarse_config, coarse_state, turbine_field=tf, annotate=False)
+                self.level_iterations.append(coarse_config.solver_cache.newton_iterations() - iterations)
+            finally:
+                coarse_config.params["dump_period"] = dump_period
+
+        if coarse_state is not None:
+            state.assign(transfer(coarse_state, state.function_space()), annotate=False)
+
+        self.iterations_before_target = self.config.solver_cache.newton_iterations()
+
+    def function_space(self, coarse_config, V):
+        ''' Returns the state function space of the coarse configuration that matches the state function space V. '''
+        return {2: coarse_config.function_space,
+                3: coarse_config.function_space_enriched,
+                4: coarse_config.function_space_2enriched}[V.num_sub_spaces()]
+
+    def report(self):
+        ''' Reports the Newton iterations of the most recent mesh sequencing solve. Must be called after the target problem was solved. '''
+        target_iterations = self.config.solver_cache.newton_iterations() - self.iterations_before_target
+        info_green("Mesh sequencing needed %s Newton iterations on the coarse levels and %i on the target mesh." % (" + ".join([str(i) for i in self.level_iterations]), target_iterations))
@@ -0,0 +1,72 @@
+import shallow_water_model as sw_model
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue
+from parallel_reduced_functional import ParallelReducedFunctional
+from state_cache import StateCache
+
+
+def snapshot_times(params):
+    ''' Returns the times of the snapshots, as in the time loop of the forward model. '''
+    times = []
+    t = params["start_time"]
+    while t < params["finish_time"]:
+        t += params["dt"]
+        times.append(t)
+    return times
+
+
+class MultiSteadyReducedFunctional(ParallelReducedFunctional):
+    ''' A reduced functional for multi-steady state simulations (include_time_term=False), in which every
+        timestep is an independent steady state solve with the boundary forcing of its time (a snapshot).
+        Each snapshot is solved with its own forward and adjoint model, and the functional values and
+        gradients of the snapshots are summed. The snapshots are evaluated concurrently in params["multi_steady_processes"]
+        worker processes that are forked from the current process. In parallel (MPI) runs, the snapshots are
+        evaluated one after another. The functional is the sum of the snapshot functionals, as with
+        functional_quadrature_degree=0 in a sequential multi-steady state simulation. '''
+
+    def __init__(self, config, scale=1.0, forward_model=sw_model.sw_solve, plot=False, save_functional_values=False):
+        params = config.params
+        self.snapshot_times = snapshot_times(params)
+        # The snapshot functionals are summed with unit weights
+        super(MultiSteadyReducedFunctional, self).__init__(config, [1.0] * len(self.snapshot_times), params["multi_steady_processes"],
+                                                           scale, forward_model, plot, save_functional_values)
+        if params["include_time_term"] or params["steady_state"]:
+            raise ValueError("The multi-steady state reduced functional requires include_time_term=False.")
+        if params["functional_quadrature_degree"] != 0 or params["functional_final_time_only"]:
+            raise ValueError("The multi-steady state reduced functional requires functional_quadrature_degree=0.")
+        if "dynamic_turbine_friction" in params["controls"]:
+            raise NotImplementedError("The multi-steady state reduced functional does not support a dynamic turbine friction control.")
+
+        # Each snapshot keeps its own initial guesses
+        self.state_caches = [StateCache() for t in self.snapshot_times]
+
+    def solve(self, i, m, gradient):
+        ''' Solves snapshot i. Returns its functional value, its gradient if gradient is True, and its final state vector. '''
+        config = self.__config__
+        params = config.params
+        saved = dict((key, params[key]) for key in ["start_time", "finish_time", "dump_period", "output_turbine_power", "forward_checkpoint_period"])
+        state_cache = config.state_cache
+        params["start_time"] = self.snapshot_times[i] - params["dt"]
+        params["finish_time"] = self.snapshot_times[i]
+        # The worker processes must not write to the same output files
+        params["dump_period"] = 0
+        params["output_turbine_power"] = False
+        params["forward_checkpoint_period"] = 0
+        config.state_cache = self.state_caches[i]
+        try:
+            info_blue("Solving snapshot %i of %i at time %s." % (i + 1, len(self.snapshot_times), self.snapshot_times[i]))
+            j = self.sequential_functional(m, annotate=gradient)
+            dj = self.sequential_gradient(m, forget=True) if gradient else None
+        finally:
+            params.update(saved)
+            config.state_cache = state_cache
+        return j, dj, self.last_state.vector().array()
+
+    def keep_state(self, i, x):
+        ''' Keeps the state of snapshot i as the initial guess of its next solve. Each snapshot solves a single
+            timestep, whose state is cached under timestep 1. '''
+        config = self.__config__
+        if config.params["cache_forward_state"]:
+            self.state_caches[i].update(config)
+            self.state_caches[i].store_array(1, x)
@@ -0,0 +1,129 @@
+import threading
+import Queue
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import print0, function_eval
+import shallow_water_model
+
+
+class Observer(object):
+    ''' An observer of the time loop of the forward model. Register observers in config.params["observers"].
+        After every sampling_period timesteps, the observer is called with the current time, state and turbine field.
+        Subclasses override observe, or a callback(t, state, turbine_field) is given.
+        If asynchronous is True, the observer is called in a background thread with copies of the state and turbine
+        field, so that the time loop does not wait for it. Asynchronous observers must not use collective operations
+        such as assembly or parallel point evaluations, because the processes may call them at different times. '''
+
+    def __init__(self, callback=None, sampling_period=1, asynchronous=False):
+        if sampling_period < 1:
+            raise ValueError("The sampling period must be a positive number of timesteps.")
+        self.callback = callback
+        self.sampling_period = sampling_period
+        self.asynchronous = asynchronous
+        self.queue = None
+        self.thread = None
+        self.error = None
+
+    def observe(self, t, state, turbine_field):
+        self.callback(t, state, turbine_field)
+
+    def notify(self, timestep, t, state, turbine_field):
+        ''' Called by the forward model after each timestep. '''
+        if timestep % self.sampling_period != 0:
+            return
+
+        if not self.asynchronous:
+            self.observe(t, state, turbine_field)
+            return
+
+        if self.thread is None:
+            self.queue = Queue.Queue()
+            self.thread = threading.Thread(target=self.worker)
+            self.thread.daemon = True
+            self.thread.start()
+
+        state_copy = Function(state, annotate=False)
+        turbine_field_copy = None if turbine_field is None else Function(turbine_field, annotate=False)
+        self.queue.put((t, state_copy, turbine_field_copy))
+
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                if self.error is None:
+                    self.observe(*item)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def finalize(self):
+        ''' Called by the forward model after the time loop. Waits until all asynchronous observations are processed. '''
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+def finalize_observers(observers, ignore_errors=False):
+    ''' Finalizes all observers, also if one of them raises an error. The first error is raised afterwards, unless
+        ignore_errors is True. This is used if the time loop has failed, so that its own error is raised. '''
+    error = None
+    for observer in observers:
+        try:
+            observer.finalize()
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None and not ignore_errors:
+        raise error
+
+
+def observer_list(observers):
+    ''' Returns the list of observers, in which plain callbacks are wrapped into Observers. '''
+    return [observer if isinstance(observer, Observer) else Observer(observer) for observer in observers]
+
+
+class ThrustPlotObserver(Observer):
+    ''' Compares the thrust force of the turbine thrust parametrisations with the thrust that is expected from the inflow velocity.
+        The inflow velocity is measured at inflow_point and the upstream velocity estimate at upstream_point.
+        The history of all observations is plotted to plot_file. '''
+
+    def __init__(self, config, inflow_point=(10, 160), upstream_point=(640. / 3, 160), plot_file="thrust_plot.pdf", sampling_period=1):
+        super(ThrustPlotObserver, self).__init__(sampling_period=sampling_period)
+        self.config = config
+        self.inflow_point = inflow_point
+        self.upstream_point = upstream_point
+        self.plot_file = plot_file
+        self.us = []
+        self.thrusts = []
+        self.thrusts_est = []
+
+    def observe(self, t, state, turbine_field):
+        up_u = split(state)[2]
+        u_inflow = function_eval(state.split()[0].sub(0), self.inflow_point)
+
+        thrust = shallow_water_model.thrust_force(u_inflow, min=min)((0))
+        thrust_est = assemble(shallow_water_model.thrust_force(up_u) * turbine_field / self.config.turbine_cache.turbine_integral() * dx, annotate=False)
+
+        print0("Inflow velocity: ", u_inflow)
+        print0("Estimated upstream velocity: ", function_eval(state.split()[2], self.upstream_point))
+        print0("Expected thrust force: ", thrust)
+        print0("Total amount of thurst force applied: ", thrust_est)
+
+        self.us.append(u_inflow)
+        self.thrusts.append(thrust)
+        self.thrusts_est.append(thrust_est)
+
+        if MPI.process_number() == 0:
+            import matplotlib.pyplot as plt
+            plt.clf()
+            plt.plot(self.us, self.thrusts, label="Analytical")
+            plt.plot(self.us, self.thrusts_est, label="Approximated")
+            plt.legend(loc=2)
+            plt.savefig(self.plot_file, format='pdf')
@@ -0,0 +1,69 @@
+import memoize
+from helpers import parallel_map
+from reduced_functional import ReducedFunctional
+
+
+class ParallelReducedFunctional(ReducedFunctional):
+    ''' The base class of the reduced functionals whose functional is the weighted sum of independent subproblems,
+        such as flow scenarios or steady state snapshots, that are solved in worker processes forked from the current
+        process. In parallel (MPI) runs, the subproblems are solved one after another.
+        Subclasses implement solve(i, m, gradient), which returns the functional value of subproblem i, its gradient
+        if gradient is True and its final state vector, and keep_state(i, x), which keeps the final state vector x of
+        subproblem i in the current process. '''
+
+    def __init__(self, config, weights, processes, scale, forward_model, plot, save_functional_values):
+        super(ParallelReducedFunctional, self).__init__(config, scale, forward_model, plot, save_functional_values)
+        self.weights = weights
+        self.processes = processes
+
+        # The functional and gradient of the configuration, computed in the current process
+        self.sequential_functional = self.compute_functional_mem.fn
+        self.sequential_gradient = self.compute_gradient_mem.fn
+
+        hash_keys = (config.params["turbine_parametrisation"] == "smeared")
+        self.compute_functional_mem = memoize.MemoizeMutable(self.compute_functional, hash_keys)
+        self.compute_gradient_mem = memoize.MemoizeMutable(self.compute_gradient, hash_keys)
+
+    def solve(self, i, m, gradient):
+        raise NotImplementedError("ParallelReducedFunctional.solve needs to be overloaded.")
+
+    def keep_state(self, i, x):
+        raise NotImplementedError("ParallelReducedFunctional.keep_state needs to be overloaded.")
+
+    def evaluate(self, m, gradient):
+        ''' Solves all subproblems and returns the weighted functional value and gradient. '''
+        jobs = [(i, m, gradient) for i in range(len(self.weights))]
+        results = parallel_map(self.solve, jobs, self.processes)
+
+        # The final states of the worker processes are kept as initial guesses of the next solves
+        for i, (j_i, dj_i, x_i) in enumerate(results):
+            self.keep_state(i, x_i)
+        # The turbine cache of this process is used for the output
+        self.update_turbine_cache(m)
+
+        j = sum([w * j_i for (w, (j_i, dj_i, x_i)) in zip(self.weights, results)])
+        dj = sum([w * dj_i for (w, (j_i, dj_i, x_i)) in zip(self.weights, results)]) if gradient else None
+        return j, dj
+
+    def memoize(self, m, j, dj):
+        ''' Stores the functional value and the gradient of a gradient evaluation, so that the reduced functional
+            does not solve the subproblems again when it is asked for the other value at m. '''
+        for annotate in [True, False]:
+            self.compute_functional_mem.insert(j, m, annotate=annotate)
+        for forget in [True, False]:
+            self.compute_gradient_mem.insert(dj, m, forget)
+
+    def compute_functional(self, m, annotate=True):
+        ''' Returns the weighted sum of the subproblem functionals. With annotate, the subproblem gradients are
+            computed in the same worker pass, since the optimiser asks for the gradient at the same point next.
+            The subproblems are never annotated in the current process. '''
+        j, dj = self.evaluate(m, annotate)
+        if annotate:
+            self.memoize(m, j, dj)
+        return j
+
+    def compute_gradient(self, m, forget=True):
+        ''' Returns the weighted sum of the subproblem gradients. '''
+        j, dj = self.evaluate(m, True)
+        self.memoize(m, j, dj)
+        return dj
@@ -16,6 +16,27 @@ class ParameterDictionary(dict):
             'steady_state': 'steady state simulation',
             'functional_final_time_only': 'if the functional should be evaluated at the final time only (used if the time stepping is used to converge to a steady state)',
             'functional_quadrature_degree': 'quadrature degree of the functional integral evaluation',
+            'imex': 'implicit-explicit time integration of nonlinear unsteady problems: the advection is explicit and the quadratic friction coefficient is lagged. The explicit terms are subject to a CFL condition',
+            'imex_explicit_friction': 'treat the quadratic friction explicitly in the IMEX scheme, such that the implicit operator is constant and factorised only once. If False, the friction is semi-implicit and the operator is reassembled in every timestep',
+            'harmonic_balance_harmonics': 'number of harmonics of the periodic solution of the harmonic balance solver (harmonic_balance.hb_solve)',
+            'multi_steady_processes': 'number of worker processes of the MultiSteadyReducedFunctional; use 0 for the number of CPUs',
+            'spin_up_file': 'the HDF5 file of a spin-up state (see spin_up_state.spin_up) from which the forward runs start instead of the initial condition',
+            'forward_checkpoint_period': 'number of timesteps between the binary checkpoints of the forward time loop; use 0 to disable the checkpoints',
+            'forward_checkpoint_file': 'the base name of the forward checkpoint files in base_path, one per process',
+            'resume_from_forward_checkpoint': 'resume the forward run from the most recent forward checkpoint (requires annotate=False)',
+            'pod_training_runs': 'number of full forward runs whose states train the PODSurrogate',
+            'pod_tolerance': 'relative energy of the snapshots that the POD and DEIM bases of the PODSurrogate may discard',
+            'pod_max_modes': 'maximum number of POD and DEIM modes of the PODSurrogate',
+            'parareal_slices': 'number of time slices of the parareal solver (parareal.Parareal)',
+            'parareal_coarse_dt': 'timestep of the coarse propagator of the parareal solver; must divide the length of the time slices',
+            'parareal_tolerance': 'tolerance for the relative change of the functional between two parareal iterations',
+            'parareal_processes': 'number of worker processes of the parareal solver; use 0 for the number of CPUs',
+            'explicit_ssprk_order': 'order of the strong stability preserving Runge-Kutta scheme of the explicit model (explicit_model.ssprk_solve). Valid values: 1, 2, 3',
+            'explicit_cfl': 'CFL number from which the explicit model computes its timestep with the velocity of the initial state; a warning is printed if it is exceeded later in the run. Use 0 to use dt instead',
+            'adaptive_timestepping': 'adapts the timestep with a step doubling estimate of the local error. Requires the newton solver',
+            'adaptive_timestepping_tolerance': 'tolerance for the relative local error of the adaptive timestepping',
+            'dt_min': 'minimum timestep of the adaptive timestepping; if None, dt / 100 is used',
+            'dt_max': 'maximum timestep of the adaptive timestepping; if None, the timestep is not bounded',
             'dump_period': 'dump period in timesteps; use 0 to deactivate disk outputs',
             'bctype': 'type of boundary condition to be applied',
             'strong_bc': 'list of strong dirichlet boundary conditions to be applied',
@@ -39,13 +60,24 @@ class ParameterDictionary(dict):
             'turbine_friction': 'turbine friction',
             'turbine_thrust_parametrisation': 'parametrise the turbine based on speed/thrust and speed/power functions. If False, the turbines are parametrised as increased friction.',
             'implicit_turbine_thrust_parametrisation': 'implicitly parametrise the turbine based on speed/thrust and speed/power functions. If False, the turbines are parametrised as increased friction.',
+            'segregated_thrust_solve': 'solve the upstream velocity equations of the thrust parametrisations separately from the shallow water equations with a block Gauss-Seidel iteration, restricted to the turbine support',
+            'segregated_thrust_tolerance': 'relative tolerance of the block Gauss-Seidel iteration of the segregated thrust solve',
             'rho': 'the density of the fluid',
             'controls': 'a list of the control variables. Valid list values: "turbine_pos" for the turbine position, "turbine_friction" for the friction of the turbine',
             'newton_solver': 'newton solver instead of a picard iteration',
+            'newton_line_search': 'line search of the newton solver. Valid values: "bt" for a backtracking line search, "basic" for the full (undamped) newton step',
+            'newton_damped_retries': 'number of times a failed newton solve is restarted from the initial guess with a halved newton step',
             'linear_solver': 'default linear solver',
-            'preconditioner': 'default preconditioner',
+            'num_threads': 'number of threads for the multithreaded assembly of the forward, functional and adjoint forms. Requires DOLFIN with OpenMP support. Use 0 to keep the DOLFIN setting. The previous setting is restored after each forward and adjoint solve',
+            'preconditioner': 'default preconditioner. Use "fieldsplit" for a Schur complement preconditioner of the velocity/free-surface blocks',
+            'initial_guess_extrapolation': 'number of previous (control, state) pairs from which the initial guess of a warm-started steady state solve is extrapolated; use 1 to start from the most recent state',
+            'continuation_stages': 'number of continuation stages that are solved before a cold-started steady state solve; use 0 to deactivate the continuation',
+            'continuation_parameter': 'the parameter that is ramped in the continuation stages. Valid values: "diffusion_coef", "inflow", "turbine_friction"',
+            'continuation_baseline': 'also solve the cold-started target problem without continuation to report the Newton iterations saved by the continuation',
+            'mesh_sequence': 'a list of configurations on coarser meshes (coarsest first) that are solved to compute the initial guess of a cold-started steady state solve; takes precedence over the continuation',
             'picard_relative_tolerance': 'relative tolerance for the picard iteration',
             'picard_iterations': 'maximum number of picard iterations',
+            'picard_acceleration': 'number of previous iterates used for the Anderson acceleration of the picard iteration; use 0 to deactivate the acceleration; the acceleration requires annotate=False',
             'run_benchmark': 'benchmark to compare different solver/preconditioner combinations',
             'solver_exclude': 'solvers/preconditioners to be excluded from the benchmark',
             'automatic_scaling': 'activates the initial automatic scaling of the functional',
@@ -53,7 +85,11 @@ class ParameterDictionary(dict):
             'print_individual_turbine_power': 'print out the power output of each individual turbine',
             'output_turbine_power': 'output the power generation of the individual turbines',
             'save_checkpoints': 'automatically store checkpoints after each optimisation iteration',
+            'observers': 'a list of observers.Observer objects or callbacks(t, state, turbine_field) that are called after each timestep of the forward model',
             'cache_forward_state': 'caches the forward state for all timesteps and reuses them as initial guess for the next optimisation iteration',
+            'cache_forward_state_budget': 'the maximum size of the forward state cache in MB. If exceeded, the states of the later timesteps are not cached',
+            'cache_forward_state_precision': 'the precision of the cached forward states. Valid values: "double", "single"',
+            'cache_forward_state_storage': 'the storage of the cached forward states. Valid values: "memory", "compressed" (zlib compressed in memory), "mmap" (memory-mapped temporary files)',
             'base_path': 'root directory for output',
              }
 
@@ -0,0 +1,144 @@
+import numpy
+from dolfin import *
+from dolfin_adjoint import *
+import shallow_water_model
+from helpers import info_blue, info_green, info_red, parallel_map
+
+
+class Parareal(object):
+    ''' Solves an unsteady problem with the parareal algorithm. The simulation time is split into
+        params["parareal_slices"] time slices. In each iteration, the fine propagator (the forward model with
+        the timestep params["dt"]) is run on all slices concurrently in params["parareal_processes"] worker
+        processes, and the slice initial states are corrected sequentially with the coarse propagator (the
+        forward model with the timestep params["parareal_coarse_dt"]). The iteration stops when the relative
+        change of the functional is below params["parareal_tolerance"], and after params["parareal_slices"]
+        iterations at the latest, when the solution equals the sequential fine solution.
+        The worker processes are forked from the current process, hence the parareal solver requires a serial run.
+        The parareal solve is not annotated. '''
+
+    def __init__(self, config, forward_model=shallow_water_model.sw_solve):
+        self.config = config
+        self.forward_model = forward_model
+        # The relative functional changes of the iterations of the most recent solve
+        self.changes = []
+
+    def propagate(self, x, t0, t1, dt, turbine_field, functional=None, u_source=None):
+        ''' Runs the forward model from time t0 to t1 with the timestep dt, starting from the state vector x.
+            Returns the final state vector and the functional contribution of the time slice. '''
+        config = self.config
+        params = config.params
+        saved = dict((key, params[key]) for key in ["start_time", "finish_time", "dt", "dump_period", "observers",
+                                                    "cache_forward_state", "print_individual_turbine_power",
+                                                    "forward_checkpoint_period", "resume_from_forward_checkpoint"])
+        params["start_time"] = t0
+        params["finish_time"] = t1
+        params["dt"] = dt
+        params["dump_period"] = 0
+        params["observers"] = []
+        params["cache_forward_state"] = False
+        params["print_individual_turbine_power"] = False
+        params["forward_checkpoint_period"] = 0
+        params["resume_from_forward_checkpoint"] = False
+        try:
+            state = Function(self.function_space, name="Parareal_state")
+            state.vector().set_local(x)
+            state.vector().apply("insert")
+            j = self.forward_model(config, state, turbine_field=turbine_field, functional=functional, annotate=False, u_source=u_source)
+            return state.vector().array(), j
+        finally:
+            params.update(saved)
+
+    def fine(self, x, n):
+        ''' Runs the fine propagator on time slice n. The dolfin objects are taken from the solver, since they
+            are inherited by the forked worker processes but can not be sent to them. '''
+        return self.propagate(x, self.slice_times[n], self.slice_times[n + 1], self.config.params["dt"],
+                              self.turbine_field, functional=self.functional, u_source=self.u_source)
+
+    def coarse(self, x, n):
+        ''' Runs the coarse propagator on time slice n. '''
+        return self.propagate(x, self.slice_times[n], self.slice_times[n + 1], self.config.params["parareal_coarse_dt"],
+                              self.turbine_field, u_source=self.u_source)[0]
+
+    def functional_value(self, fine):
+        ''' Returns the functional value from the fine propagations of all time slices. '''
+        if self.config.params["functional_final_time_only"]:
+            return fine[-1][1]
+        return sum([j_n for (x_n, j_n) in fine])
+
+    def __call__(self, config, state, turbine_field=None, functional=None, annotate=False, u_source=None):
+        ''' Solves the problem with the initial condition state, which contains the final state on exit.
+            Returns the functional value if a functional is given. The signature matches the forward models. '''
+        if config is not self.config:
+            raise ValueError("The parareal solver was created for a different configuration.")
+        params = config.params
+        if annotate:
+            raise NotImplementedError("The parareal solve can not be annotated. Use annotate=False.")
+        if params["steady_state"] or not params["include_time_term"]:
+            raise ValueError("The parareal solver requires an unsteady problem.")
+        if type(turbine_field) == list:
+            raise NotImplementedError("The parareal solver does not support a dynamic turbine friction control.")
+        if MPI.num_processes() > 1:
+            raise ValueError("The parareal solver distributes the time slices over local worker processes and requires a serial run.")
+
+        slices = params["parareal_slices"]
+        dt = params["dt"]
+        coarse_dt = params["parareal_coarse_dt"]
+        start_time = params["start_time"]
+        steps = int(round((params["finish_time"] - start_time) / dt))
+        if slices < 1 or steps % slices != 0:
+            raise ValueError("The number of timesteps (%i) must be a multiple of parareal_slices." % steps)
+        slice_times = [start_time + n * steps / slices * dt for n in range(slices + 1)]
+        if not coarse_dt > 0 or abs((slice_times[1] - slice_times[0]) / coarse_dt - round((slice_times[1] - slice_times[0]) / coarse_dt)) > 1e-8:
+            raise ValueError("parareal_coarse_dt must divide the length of the time slices.")
+
+        self.function_space = state.function_space()
+        self.slice_times = slice_times
+        self.turbine_field = turbine_field
+        self.functional = functional
+        self.u_source = u_source
+
+        # The initial states of the time slices, computed with the coarse propagator
+        U = [state.vector().array()]
+        for n in range(slices):
+            U.append(self.coarse(U[n], n))
+        G_old = U[1:]
+
+        fine = [None] * slices
+        j = None
+        self.changes = []
+        for k in range(1, slices + 1):
+            # The initial states of the first k - 1 slices are exact, so their fine propagations are not repeated
+            jobs = [(U[n], n) for n in range(k - 1, slices)]
+            fine[k - 1:] = parallel_map(self.fine, jobs, params["parareal_processes"])
+
+            # Sequential correction with the coarse propagator
+            U_new = U[:k]
+            G_new = G_old[:k - 1]
+            for n in range(k - 1, slices):
+                G_new.append(self.coarse(U_new[n], n))
+                U_new.append(G_new[n] + fine[n][0] - G_old[n])
+            U, G_old = U_new, G_new
+
+            if functional is None:
+                jumps = [numpy.linalg.norm(fine[n][0] - U[n + 1]) / max(numpy.linalg.norm(U[n + 1]), DOLFIN_EPS) for n in range(slices)]
+                change = max(jumps)
+            else:
+                j_old, j = j, self.functional_value(fine)
+                change = abs(j - j_old) / max(abs(j), DOLFIN_EPS) if j_old is not None else float("inf")
+            self.changes.append(change)
+            info_blue("Parareal iteration %i: relative change %g." % (k, change))
+            if change <= params["parareal_tolerance"]:
+                break
+
+        if k < slices:
+            info_green("Parareal converged after %i of at most %i iterations." % (k, slices))
+        elif change > params["parareal_tolerance"]:
+            info_red("Parareal did not converge before reaching the sequential solution after %i iterations." % slices)
+
+        # The final state is the fine propagation of the last slice
+        state.vector().set_local(fine[-1][0])
+        state.vector().apply("insert")
+        params["current_time"] = params["finish_time"]
+
+        if functional is not None:
+            return self.functional_value(fine)
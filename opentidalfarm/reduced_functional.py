@@ -1,5 +1,9 @@
 import numpy
 import memoize
+import continuation
+import mesh_sequencing
+import spin_up_state
+from state_predictor import StatePredictor
 import shallow_water_model as sw_model
 import helpers
 import sys
@@ -21,12 +25,19 @@ class ReducedFunctionalNumPy(dolfin_adjoint.ReducedFunctionalNumPy):
         # Hide the configuration since changes would break the memoize algorithm.
         self.__config__ = config
         self.scale = scale
+        self.forward_model = forward_model
         self.automatic_scaling_factor = None
         self.plot = plot
         self.save_functional_values = save_functional_values
         # Caching variables that store which controls the last forward run was performed
         self.last_m = None
         self.last_state = None
+        # Parameter continuation for cold-started steady state solves
+        self.continuation = continuation.SteadyStateContinuation(config, forward_model)
+        # Mesh sequencing for cold-started steady state solves
+        self.mesh_sequencing = mesh_sequencing.MeshSequencing(config, forward_model)
+        # Extrapolates the initial guess for warm-started steady state solves
+        self.state_predictor = StatePredictor(config.params["initial_guess_extrapolation"])
         self.in_euclidian_space = False
         if self.__config__.params["dump_period"] > 0:
             self.turbine_file = File(config.params['base_path'] + os.path.sep + "turbines.pvd", "compressed")
@@ -63,7 +74,8 @@ class ReducedFunctionalNumPy(dolfin_adjoint.ReducedFunctionalNumPy):
         def compute_functional(m, return_final_state=False, annotate=True):
             ''' Takes in the turbine positions/frictions values and computes the resulting functional of interest. '''
 
-            self.last_m = m
+            # The gradient can only reuse the annotation of an annotated forward run
+            self.last_m = m if annotate else None
 
             self.update_turbine_cache(m)
             tf = config.turbine_cache.cache["turbine_field"]
@@ -87,17 +99,41 @@ class ReducedFunctionalNumPy(dolfin_adjoint.ReducedFunctionalNumPy):
             else:
                 state = Function(config.function_space, name="Current_state")
 
+            use_continuation = False
+            use_mesh_sequencing = False
             if config.params["steady_state"] and config.params["include_time_term"] and self.last_state is not None:
-                # Speed up the nonlinear solves by starting the Newton solve with the most recent state solution
-                state.assign(self.last_state, annotate=False)
+                # Speed up the nonlinear solves by starting the Newton solve with the most recent state solution,
+                # or with the extrapolation of the most recent solutions
+                if config.params["initial_guess_extrapolation"] > 1 and type(tf) != list:
+                    self.state_predictor.predict(tf, state)
+                else:
+                    state.assign(self.last_state, annotate=False)
             else:
-                ic = config.params['initial_condition']
-                state.assign(ic, annotate=False)
+                # Start from the initial condition or the saved spin-up state
+                spin_up_state.initial_state(config, state)
+
+                # A cold-started steady state solve is warm-started with the solution on coarser meshes
+                # or with the solution of an easier problem
+                if config.params["steady_state"] and config.params["include_time_term"] and len(config.params["mesh_sequence"]) > 0:
+                    use_mesh_sequencing = True
+                    self.mesh_sequencing(state, tf)
+                    adj_reset()
+                elif config.params["steady_state"] and config.params["include_time_term"] and config.params["continuation_stages"] > 0:
+                    use_continuation = True
+                    self.continuation(state, tf)
+                    adj_reset()
 
             # Solve the shallow water system
             functional = config.functional(config)
             j = forward_model(config, state, functional=functional, turbine_field=tf, annotate=annotate)
             self.last_state = state
+            if config.params["initial_guess_extrapolation"] > 1 and type(tf) != list:
+                self.state_predictor.add(tf, state)
+
+            if use_continuation:
+                self.continuation.report()
+            if use_mesh_sequencing:
+                self.mesh_sequencing.report()
 
             if return_final_state:
                 return j, state
@@ -155,7 +191,9 @@ class ReducedFunctionalNumPy(dolfin_adjoint.ReducedFunctionalNumPy):
             else:
                 parameters = InitialConditionParameter("turbine_friction_cache")
 
-            djdtf = dolfin_adjoint.compute_gradient(J, parameters, forget=forget)
+            # The adjoint forms are assembled with the same number of threads as the forward forms
+            with helpers.assembly_threads(config):
+                djdtf = dolfin_adjoint.compute_gradient(J, parameters, forget=forget)
             dolfin.parameters["adjoint"]["stop_annotating"] = False
 
             # Decide if we need to apply the chain rule to get the gradient of interest
@@ -371,8 +409,9 @@ class ReducedFunctionalNumPy(dolfin_adjoint.ReducedFunctionalNumPy):
         return numpy.array(res)
 
     def __call__(self, m):
-        ''' Interface function for dolfin_adjoint.ReducedFunctional '''
-        return self.j(m)
+        ''' Interface function for dolfin_adjoint.ReducedFunctional. Surrogate forward models with the screening
+            attribute evaluate the functional without annotation, such that only the gradients use the full model. '''
+        return self.j(m, annotate=not getattr(self.forward_model, "screening", False))
 
     def derivative(self, m_array, taylor_test=False, seed=0.001, forget=True, **kwargs):
         ''' Interface function for dolfin_adjoint.ReducedFunctional '''
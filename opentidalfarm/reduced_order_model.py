@@ -0,0 +1,478 @@
+import numpy
+import dolfin
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue, info_green, info_red
+from solvers import PrecompiledForm
+import shallow_water_model as sw_model
+
+
+def pod_basis(snapshots, tolerance, max_modes):
+    ''' Returns the proper orthogonal decomposition (POD) basis of the snapshot columns: the leading left singular
+        vectors, such that the relative energy of the discarded modes is below tolerance, but at most max_modes. '''
+    U, s, Vt = numpy.linalg.svd(snapshots, full_matrices=False)
+    energy = numpy.cumsum(s ** 2) / max(numpy.sum(s ** 2), DOLFIN_EPS)
+    r = int(numpy.searchsorted(energy, 1. - tolerance)) + 1
+    return U[:, :max(1, min(r, max_modes, len(s)))]
+
+
+def deim_indices(U):
+    ''' Returns the interpolation indices of the discrete empirical interpolation method (DEIM) for the basis U.
+        Each index is chosen where the interpolation error of the next basis vector is largest. '''
+    indices = [int(numpy.argmax(numpy.abs(U[:, 0])))]
+    for l in range(1, U.shape[1]):
+        c = numpy.linalg.solve(U[indices, :l], U[indices, l])
+        r = U[:, l] - numpy.dot(U[:, :l], c)
+        indices.append(int(numpy.argmax(numpy.abs(r))))
+    return numpy.array(indices)
+
+
+def matrix_columns(A, X):
+    ''' Returns the dense product of the dolfin matrix A with the columns of the numpy array X. '''
+    x = dolfin.Vector()
+    A.init_vector(x, 1)
+    y = dolfin.Vector()
+    A.init_vector(y, 0)
+    AX = numpy.zeros((A.size(0), X.shape[1]))
+    for i in range(X.shape[1]):
+        x.set_local(X[:, i])
+        x.apply("insert")
+        A.mult(x, y)
+        AX[:, i] = y.array()
+    return AX
+
+
+def sample_cells(mesh, dofmap, indices):
+    ''' Returns the cell markers that are 1 on the cells with a dof in indices and 0 elsewhere. The vector of a form
+        that is integrated over the marked cells equals the full vector at these dofs. '''
+    markers = CellFunction("size_t", mesh)
+    markers.set_all(0)
+    indices = set(indices)
+    for cell in cells(mesh):
+        if indices.intersection(dofmap.cell_dofs(cell.index())):
+            markers[cell] = 1
+    return markers
+
+
+def sample_facets(mesh, boundaries, markers):
+    ''' Returns the boundary labels of boundaries on the facets of the cells marked with 1, and 0 elsewhere. '''
+    tdim = mesh.topology().dim()
+    mesh.init(tdim - 1, tdim)
+    facet_markers = FacetFunction("size_t", mesh)
+    facet_markers.set_all(0)
+    for facet in facets(mesh):
+        if any([markers[int(c)] == 1 for c in facet.entities(tdim)]):
+            facet_markers[facet] = boundaries[facet]
+    return facet_markers
+
+
+def sample_dofs(mesh, dofmap, markers):
+    ''' Returns the dofs of the cells marked with 1. '''
+    dofs = set()
+    for cell in cells(mesh):
+        if markers[cell] == 1:
+            dofs.update(dofmap.cell_dofs(cell.index()))
+    return numpy.array(sorted(dofs), dtype=numpy.intc)
+
+
+def measure_markers(measure):
+    ''' Returns the cell markers of a measure. '''
+    if hasattr(measure, "subdomain_data"):
+        return measure.subdomain_data()
+    return measure.domain_data()
+
+
+def deim_projection(V, U, indices):
+    ''' Returns the matrix that maps the values of a vector at the DEIM indices of the basis U to the projection of
+        its DEIM approximation onto the basis V. '''
+    return numpy.dot(V.T, numpy.linalg.solve(U[indices].T, U.T).T)
+
+
+class PODSurrogate(object):
+    ''' A reduced-order surrogate of a forward model for the fast screening of turbine layouts. It is used as the
+        forward_model of the ReducedFunctional.
+        The full forward runs of the first params["pod_training_runs"] distinct turbine layouts collect the states of
+        all timesteps. The surrogate is then trained: the state is approximated by its snapshot mean plus a POD basis, and the
+        theta scheme is projected onto the basis (Galerkin projection). The nonlinear friction and advection terms and
+        the boundary and source forcing are hyper-reduced with DEIM: they are only assembled on the cells around the
+        DEIM interpolation dofs, and the state is only expanded on the dofs of these cells. The functional is
+        hyper-reduced in the same way if it is the sum of a term that is linear in the turbine field and a term that
+        only depends on the turbine field, as the DefaultFunctional. Otherwise it is assembled with the full state.
+        After training, unannotated runs use the reduced model, and annotated runs (which are needed for the gradients)
+        use the full model. Once the surrogate is trained, the line-search evaluations of ReducedFunctional.__call__ are
+        not annotated (see screening), so that only the gradients at accepted points use the full model. Before that,
+        they are annotated, so that the gradient at the same point reuses the annotated training run.
+        The turbine friction is integrated over the whole domain, which assumes that it vanishes outside the site.
+        The surrogate requires a serial run and weak boundary conditions. '''
+
+    newton_tolerance = 1e-10
+    newton_iterations = 20
+
+    def __init__(self, config, forward_model=sw_model.sw_solve):
+        params = config.params
+        if params["steady_state"] or not params["include_time_term"]:
+            raise ValueError("The POD surrogate requires an unsteady problem.")
+        if params["bctype"] == "strong_dirichlet":
+            raise NotImplementedError("The POD surrogate does not support strong Dirichlet boundary conditions.")
+        if params["turbine_thrust_parametrisation"] or params["implicit_turbine_thrust_parametrisation"]:
+            raise NotImplementedError("The POD surrogate does not support the thrust turbine parametrisations.")
+        if "dynamic_turbine_friction" in params["controls"]:
+            raise NotImplementedError("The POD surrogate does not support a dynamic turbine friction control.")
+        if MPI.num_processes() > 1:
+            raise ValueError("The POD surrogate requires a serial run.")
+
+        self.config = config
+        self.forward_model = forward_model
+        self.nonlinear = params["quadratic_friction"] or params["include_advection"]
+        # The snapshots of the training runs as pairs of state and turbine field vectors
+        self.snapshots = []
+        self.training_runs = 0
+        # The turbine fields of the training runs, which only count once per layout
+        self.training_layouts = set()
+        self.trained = False
+        self.u_source = None
+
+        function_space = config.function_space
+        self.w = Function(function_space, name="POD_state")
+        self.tf = Function(config.turbine_function_space, name="POD_turbine_friction")
+        # The turbine field at which the functional density is linearised
+        self.tf_zero = Function(config.turbine_function_space, name="POD_zero_turbine_friction")
+        u, h = TrialFunctions(function_space)
+        v, q = TestFunctions(function_space)
+        self.mass_form = (inner(u, v) + inner(h, q)) * dx
+        if self.nonlinear:
+            self.nonlinear_full_form = PrecompiledForm(self.nonlinear_form(dx))
+
+    @property
+    def screening(self):
+        ''' The evaluations of ReducedFunctional.__call__ are not annotated, and hence use the reduced model, once the
+            surrogate is trained. '''
+        return self.trained
+
+    def nonlinear_form(self, measure):
+        ''' Returns the nonlinear terms of the residual of the shallow water equations at the state self.w, integrated
+            with measure. '''
+        params = self.config.params
+        u, h = split(self.w)
+        v, q = TestFunctions(self.config.function_space)
+        N = 0
+        if params["quadratic_friction"]:
+            N += (params["friction"] + self.tf) / params["depth"] * dot(u, u) ** 0.5 * inner(u, v) * measure
+        if params["include_advection"]:
+            N += inner(dot(grad(u), u), v) * measure
+        return N
+
+    def forcing_form(self, u_source, ds, measure):
+        ''' Returns the forcing b of the linear terms R(x) = K x - b of the residual by the weak boundary conditions and
+            the source term, integrated with the boundary measure ds and the measure. '''
+        u, h = split(self.w)
+        v, q = TestFunctions(self.config.function_space)
+        B, forcing = sw_model.boundary_terms(self.config, u, h, q, ds=ds)
+        b = -forcing
+        if u_source:
+            b += inner(u_source, v) * measure
+        return b
+
+    def density_form(self, functional):
+        ''' Returns the derivative of the functional at the state self.w with respect to the turbine field. '''
+        return derivative(functional.Jt(self.w, self.tf_zero), self.tf_zero)
+
+    def stiffness_form(self):
+        ''' Returns the stiffness matrix form of the remaining linear terms R(x) = K x - b of the residual. '''
+        config = self.config
+        params = config.params
+        saved = dict((key, params[key]) for key in ["quadratic_friction", "include_advection", "friction"])
+        quadratic_friction = params["quadratic_friction"]
+        params["include_advection"] = False
+        if quadratic_friction:
+            params["quadratic_friction"] = False
+            params["friction"] = Constant(0.)
+        u, h = TrialFunctions(config.function_space)
+        v, q = TestFunctions(config.function_space)
+        try:
+            R = sw_model.spatial_residual(config, u, h, v, q, None if quadratic_friction else self.tf)
+        finally:
+            params.update(saved)
+        return lhs(R)
+
+    def set_vector(self, function, x):
+        function.vector().set_local(x)
+        function.vector().apply("insert")
+
+    def set_turbine_field(self, turbine_field):
+        if turbine_field is None:
+            self.tf.vector().zero()
+        else:
+            self.set_vector(self.tf, turbine_field)
+
+    def set_sample_state(self, a):
+        ''' Sets self.w to the state with the reduced coordinates a on the dofs of the sample cells. The other dofs are
+            not used by the sampled forms. '''
+        self.w.vector()[self.sample_dofs] = self.x_mean_sample + numpy.dot(self.V_sample, a)
+        self.w.vector().apply("insert")
+
+    def __call__(self, config, state, turbine_field=None, functional=None, annotate=True, u_source=None):
+        ''' Solves the problem with the full or the reduced model. The signature matches the forward models. '''
+        if config is not self.config:
+            raise ValueError("The POD surrogate was created for a different configuration.")
+        if type(turbine_field) == list:
+            raise NotImplementedError("The POD surrogate does not support a dynamic turbine friction control.")
+        if annotate or not self.trained:
+            return self.full_solve(state, turbine_field, functional, annotate, u_source)
+        return self.reduced_solve(state, turbine_field, functional, u_source)
+
+    def full_solve(self, state, turbine_field, functional, annotate, u_source):
+        ''' Solves the problem with the full forward model. Collects the snapshots of the training runs, the first
+            run of each turbine layout. '''
+        params = self.config.params
+        tf = None if turbine_field is None else turbine_field.vector().array()
+        layout = None if tf is None else tf.tostring()
+        training = not self.trained and layout not in self.training_layouts
+        if training:
+            self.training_layouts.add(layout)
+            self.snapshots.append((state.vector().array(), tf))
+            self.u_source = u_source
+            observers = params["observers"]
+            params["observers"] = observers + [lambda t, s, turbines: self.snapshots.append((s.vector().array(), tf))]
+        try:
+            j = self.forward_model(self.config, state, turbine_field=turbine_field, functional=functional, annotate=annotate, u_source=u_source)
+        finally:
+            if training:
+                params["observers"] = observers
+
+        if training:
+            self.training_runs += 1
+            if self.training_runs >= params["pod_training_runs"]:
+                self.train()
+        return j
+
+    def forcing_times(self):
+        ''' Returns the times at which the theta scheme evaluates the forcing. '''
+        params = self.config.params
+        times = []
+        t = params["start_time"]
+        while t < params["finish_time"]:
+            t += params["dt"]
+            times.append(t - (1.0 - params["theta"]) * params["dt"])
+        return times
+
+    def set_forcing_time(self, t):
+        params = self.config.params
+        expr = params["flather_bc_expr"] if params["bctype"] == "flather" else params["weak_dirichlet_bc_expr"]
+        expr.t = t
+        if self.u_source:
+            self.u_source.t = t
+
+    def train(self):
+        ''' Computes the POD basis and the DEIM hyper-reductions from the snapshots of the training runs. '''
+        config = self.config
+        params = config.params
+        mesh = config.domain.mesh
+        dofmap = config.function_space.dofmap()
+        tolerance = params["pod_tolerance"]
+        max_modes = params["pod_max_modes"]
+
+        X = numpy.array([x for (x, tf) in self.snapshots]).T
+        self.x_mean = X.mean(axis=1)
+        self.V = pod_basis(X - self.x_mean[:, numpy.newaxis], tolerance, max_modes)
+        self.Mr = numpy.dot(self.V.T, matrix_columns(dolfin.assemble(self.mass_form), self.V))
+        self.stiffness = PrecompiledForm(self.stiffness_form())
+        info_green("POD surrogate: %i modes from %i snapshots." % (self.V.shape[1], X.shape[1]))
+        # The cells on which the state is needed
+        state_markers = []
+
+        if self.nonlinear:
+            # The nonlinear terms of the snapshots
+            N = []
+            for (x, tf) in self.snapshots:
+                self.set_vector(self.w, x)
+                self.set_turbine_field(tf)
+                N.append(self.nonlinear_full_form.assemble().array())
+            U = pod_basis(numpy.array(N).T, tolerance, max_modes)
+            self.indices = deim_indices(U)
+            self.deim_projection = deim_projection(self.V, U, self.indices)
+
+            # The nonlinear terms at the DEIM indices only need the cells around them
+            markers = sample_cells(mesh, dofmap, self.indices)
+            state_markers.append(markers)
+            sample_form = self.nonlinear_form(Measure("dx")[markers](1))
+            self.sample_form = PrecompiledForm(sample_form)
+            self.sample_jacobian = PrecompiledForm(derivative(sample_form, self.w))
+            info_green("POD surrogate: %i DEIM indices on %i of %i cells." % (len(self.indices), sum(markers.array()), mesh.num_cells()))
+
+        # The forcing of the training times. It does not depend on the state or the turbines.
+        forcing_full_form = PrecompiledForm(self.forcing_form(self.u_source, config.domain.ds, dx))
+        B = []
+        for t in self.forcing_times():
+            self.set_forcing_time(t)
+            B.append(forcing_full_form.assemble().array())
+        U = pod_basis(numpy.array(B).T, tolerance, max_modes)
+        self.forcing_indices = deim_indices(U)
+        self.forcing_projection = deim_projection(self.V, U, self.forcing_indices)
+        markers = sample_cells(mesh, dofmap, self.forcing_indices)
+        ds_sample = Measure("ds")[sample_facets(mesh, config.domain.boundaries, markers)]
+        self.forcing_sample_form = PrecompiledForm(self.forcing_form(self.u_source, ds_sample, Measure("dx")[markers](1)))
+        info_green("POD surrogate: %i forcing DEIM indices on %i of %i cells." % (len(self.forcing_indices), sum(markers.array()), mesh.num_cells()))
+
+        self.train_functional(state_markers)
+
+        # The state is only expanded on the dofs of the cells of the sampled forms
+        if len(state_markers) > 0:
+            self.sample_dofs = numpy.unique(numpy.concatenate([sample_dofs(mesh, dofmap, markers) for markers in state_markers])).astype(numpy.intc)
+        else:
+            self.sample_dofs = numpy.array([], dtype=numpy.intc)
+        self.x_mean_sample = self.x_mean[self.sample_dofs]
+        self.V_sample = self.V[self.sample_dofs]
+
+        self.snapshots = []
+        self.training_layouts = set()
+        self.trained = True
+
+    def train_functional(self, state_markers):
+        ''' Computes the DEIM hyper-reduction of the functional density, the derivative of the functional with respect
+            to the turbine field. The functional is J(x, tf) = density(x) * tf + r(tf) if the remainder r does not
+            depend on the state, which is checked with the snapshots. '''
+        config = self.config
+        params = config.params
+        mesh = config.domain.mesh
+        functional = config.functional(config)
+        self.functional_type = type(functional)
+        self.functional_form = PrecompiledForm(functional.Jt(self.w, self.tf))
+        self.density_full_form = PrecompiledForm(self.density_form(functional))
+        self.density_basis = None
+
+        P = []
+        remainders = {}
+        J_max = DOLFIN_EPS
+        for (x, tf) in self.snapshots:
+            self.set_vector(self.w, x)
+            self.set_turbine_field(tf)
+            p = self.density_full_form.assemble().array()
+            J = self.functional_form.assemble()
+            P.append(p)
+            J_max = max(J_max, abs(J))
+            r = J - numpy.dot(p, self.tf.vector().array())
+            remainders.setdefault(None if tf is None else tf.tostring(), []).append(r)
+        deviation = max([max(r) - min(r) for r in remainders.values()])
+        if deviation > 1e-8 * J_max:
+            info_red("POD surrogate: the functional is not linear in the turbine field and is assembled with the full state.")
+            return
+
+        U = pod_basis(numpy.array(P).T, params["pod_tolerance"], params["pod_max_modes"])
+        self.density_indices = deim_indices(U)
+        self.density_basis = U
+        markers = sample_cells(mesh, config.turbine_function_space.dofmap(), self.density_indices)
+        state_markers.append(markers)
+
+        # The functional integrates over the site, which is restricted to the sample cells
+        site_markers = measure_markers(config.site_dx)
+        sample_site_markers = CellFunction("size_t", mesh)
+        sample_site_markers.set_all(0)
+        for cell in cells(mesh):
+            if markers[cell] == 1:
+                sample_site_markers[cell] = site_markers[cell]
+        site_dx = config.site_dx
+        config.site_dx = Measure("dx")[sample_site_markers]
+        try:
+            self.density_sample_form = PrecompiledForm(self.density_form(functional))
+        finally:
+            config.site_dx = site_dx
+        info_green("POD surrogate: %i functional DEIM indices on %i of %i cells." % (len(self.density_indices), sum(markers.array()), mesh.num_cells()))
+
+    def reduced_solve(self, state, turbine_field, functional, u_source):
+        ''' Solves the problem with the reduced model. The time loop and the functional follow the full forward model.
+            Each timestep only assembles the sampled forms. '''
+        params = self.config.params
+        if u_source is not self.u_source:
+            raise ValueError("The POD surrogate was trained with a different source term.")
+        timer = dolfin.Timer("POD surrogate solve")
+        self.set_turbine_field(None if turbine_field is None else turbine_field.vector().array())
+
+        V = self.V
+        x_mean = self.x_mean
+        K = self.stiffness.assemble()
+        Kr = numpy.dot(V.T, matrix_columns(K, V))
+        k_mean = numpy.dot(V.T, matrix_columns(K, x_mean[:, numpy.newaxis])[:, 0])
+
+        theta = params["theta"]
+        dt = params["dt"]
+        functional_final_time_only = params["functional_final_time_only"]
+
+        def residual(a_new, a_old, forcing):
+            ''' Returns the reduced residual of the theta scheme and its Jacobian. '''
+            a_mid = theta * a_new + (1 - theta) * a_old
+            G = numpy.dot(self.Mr, a_new - a_old) / dt + numpy.dot(Kr, a_mid) + k_mean - forcing
+            J = self.Mr / dt + theta * Kr
+            if self.nonlinear:
+                self.set_sample_state(a_mid)
+                G += numpy.dot(self.deim_projection, self.sample_form.assemble().array()[self.indices])
+                jacobian = self.sample_jacobian.assemble()
+                rows = numpy.zeros((len(self.indices), V.shape[1]))
+                for k, i in enumerate(self.indices):
+                    columns, values = jacobian.getrow(int(i))
+                    rows[k] = numpy.dot(values, V[columns])
+                J += theta * numpy.dot(self.deim_projection, rows)
+            return G, J
+
+        t = params["start_time"]
+        params["current_time"] = t
+        a = numpy.dot(V.T, state.vector().array() - x_mean)
+
+        if functional is not None:
+            # The hyper-reduction is trained with the functional of the configuration
+            hyper_reduced_functional = self.density_basis is not None and type(functional) is self.functional_type
+            if hyper_reduced_functional:
+                # J(x, tf) = density(x) * tf + r(tf), where the density is interpolated from its DEIM indices.
+                # The weights of the DEIM values and the remainder are computed once for the turbine field.
+                U = self.density_basis
+                tf = self.tf.vector().array()
+                weights = numpy.linalg.solve(U[self.density_indices].T, numpy.dot(U.T, tf))
+                self.set_vector(self.w, state.vector().array())
+                Jt_initial = self.functional_form.assemble()
+                remainder = Jt_initial - numpy.dot(self.density_full_form.assemble().array(), tf)
+            else:
+                Jt_form = PrecompiledForm(functional.Jt(state, turbine_field))
+                Jt_initial = Jt_form.assemble()
+
+            if functional_final_time_only:
+                j = 0.
+            else:
+                quad = 0.5 if params["functional_quadrature_degree"] == 1 else 0.
+                j = dt * quad * Jt_initial
+
+        while (t < params["finish_time"]):
+            a_old = a.copy()
+            t += dt
+            params["current_time"] = t
+            self.set_forcing_time(t - (1.0 - theta) * dt)
+            forcing = numpy.dot(self.forcing_projection, self.forcing_sample_form.assemble().array()[self.forcing_indices])
+
+            for iteration in range(self.newton_iterations):
+                G, J = residual(a, a_old, forcing)
+                da = numpy.linalg.solve(J, -G)
+                a += da
+                if not self.nonlinear or numpy.linalg.norm(da) <= self.newton_tolerance * max(1., numpy.linalg.norm(a)):
+                    break
+            else:
+                info_red("POD surrogate: the reduced Newton solver did not converge at time %s." % t)
+
+            if functional is not None and not (functional_final_time_only and t < params["finish_time"]):
+                if hyper_reduced_functional:
+                    self.set_sample_state(a)
+                    Jt = numpy.dot(weights, self.density_sample_form.assemble().array()[self.density_indices]) + remainder
+                else:
+                    self.set_vector(state, x_mean + numpy.dot(V, a))
+                    Jt = Jt_form.assemble()
+                if functional_final_time_only or params["functional_quadrature_degree"] == 0:
+                    quad = 1.0
+                elif t >= params["finish_time"]:
+                    quad = 0.5 * dt
+                else:
+                    quad = 1.0 * dt
+                j += quad * Jt
+
+        self.set_vector(state, x_mean + numpy.dot(V, a))
+        info_blue("POD surrogate solve: %g s." % timer.stop())
+
+        if functional is not None:
+            return j
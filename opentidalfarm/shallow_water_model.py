@@ -1,19 +1,16 @@
 import sys
 import os.path
+import numpy
+import dolfin
 from dolfin import *
 from dolfin_adjoint import *
-from helpers import info, info_green, info_red, info_blue, print0, StateWriter
+from helpers import info, info_green, info_red, info_blue, print0, StateWriter, with_assembly_threads
+from observers import observer_list, finalize_observers
+from functionals import IndividualTurbineContributions
+import forward_checkpoint
+from solvers import PrecompiledForm, AndersonAcceleration, DofConstraint, label_tensor, is_direct_solver
 import ufl
 
-# If cache_for_nonlinear_initial_guess is true, then we store all intermediate
-# state variables in this dictionary to be used for the next solve
-state_cache = {}
-
-# Some global variables for plotting the thurst plot - just for testing purposes
-us = []
-thrusts = []
-thrusts_est = []
-
 distance_to_upstream = 1. * 20
 
 
@@ -34,6 +31,20 @@ def smooth_uflmin(a, b, alpha=1e-8):
     return a - (norm_approx(a - b, alpha=alpha) + a - b) / 2
 
 
+def thrust_force(up_u, min=smooth_uflmin):
+    ''' Returns the thrust force for a given upstream velcocity '''
+    # Now apply a pointwise transformation based on the interpolation of a loopup table
+    c_T_coeffs = [0.08344535, -1.42428216, 9.13153605, -26.19370168, 28.8752054]
+    c_T_coeffs.reverse()
+    c_T = min(0.88, sum([c_T_coeffs[i] * up_u ** i for i in range(len(c_T_coeffs))]))
+
+    # The amount of forcing we want to apply
+    turbine_radius = 15.
+    A_c = pi * Constant(turbine_radius ** 2)  # Turbine cross section
+    f = 0.5 * c_T * up_u ** 2 * A_c
+    return f
+
+
 def upstream_u_implicit_equation(config, tf, u, up_u, o, up_u_adv, o_adv):
         ''' Returns the implicit equations that compute the turbine upstream velocities '''
 
@@ -89,17 +100,149 @@ def upstream_u_equation(config, tf, u, up_u, o):
         return up_u_eq
 
 
+def turbine_support_constraint(up_space, tf):
+    ''' Returns a constraint that sets the upstream velocity to zero at all dofs whose basis functions
+        do not overlap the turbine support. '''
+    p = TrialFunction(up_space)
+    o = TestFunction(up_space)
+    if up_space.num_sub_spaces() > 0:
+        p = p[0]
+        o = o[0]
+        dofs = up_space.sub(0).dofmap().dofs()
+    else:
+        dofs = up_space.dofmap().dofs()
+
+    # The diagonal of the mass matrix restricted to the turbine support is zero for dofs outside the support
+    chi = ufl.conditional(ufl.gt(tf, 0), 1, 0)
+    A = dolfin.assemble(chi * p * o * dx)
+    diagonal = Vector()
+    if hasattr(A, "init_vector"):
+        A.init_vector(diagonal, 0)
+    else:
+        A.resize(diagonal, 0)
+    A.get_diagonal(diagonal)
+
+    d = diagonal.array()
+    offset = diagonal.local_range()[0]
+    dofs = numpy.array(dofs)
+    dofs = dofs[(dofs >= offset) & (dofs < offset + len(d))]
+    return DofConstraint(dofs[d[dofs - offset] <= 0.])
+
+
+def gravity_wave_terms(config, u, h, v, q):
+    ''' Returns the pressure gradient and divergence terms of the residual. '''
+    params = config.params
+    # The jump terms inner(avg(v), jump(h, n)) * dS and inner(avg(u), jump(q, n)) * dS are only needed for DG element pairs
+    return params["g"] * inner(v, grad(h)) * dx - params["depth"] * inner(u, grad(q)) * dx
+
+
+def boundary_terms(config, u, h, q, bc_expr=None, ds=None):
+    ''' Returns the boundary terms of the residual as a tuple of the terms that depend on (u, h) and the forcing by the
+        weak boundary conditions, which is None for strong boundary conditions. bc_expr replaces the expression of the
+        weak boundary conditions and ds the boundary measure of the domain. '''
+    params = config.params
+    if ds is None:
+        ds = config.domain.ds
+    g = params["g"]
+    depth = params["depth"]
+    bctype = params["bctype"]
+    n = FacetNormal(config.domain.mesh)
+
+    if bctype == 'dirichlet':
+        if params["steady_state"]:
+            raise ValueError("Can not use a time dependent boundary condition for a steady state simulation")
+        # We enforce a no-normal flow on the sides by omitting the surface integral over ds(3)
+        expr = params["weak_dirichlet_bc_expr"] if bc_expr is None else bc_expr
+        B = None
+        forcing = depth * dot(expr, n) * q * ds(1) + depth * dot(expr, n) * q * ds(2)
+    elif bctype == 'flather':
+        if params["steady_state"]:
+            raise ValueError("Can not use a time dependent boundary condition for a steady state simulation")
+        expr = params["flather_bc_expr"] if bc_expr is None else bc_expr
+        B = sqrt(g * depth) * inner(h, q) * ds(1) + sqrt(g * depth) * inner(h, q) * ds(2)
+        forcing = depth * dot(expr, n) * q * ds(1)
+    elif bctype == 'strong_dirichlet':
+        # Do not replace anything in the surface integrals as the strong Dirichlet boundary condition will do that
+        B = depth * dot(u, n) * q * ds(1) + depth * dot(u, n) * q * ds(2)
+        if not params["free_slip_on_sides"]:
+            B += depth * dot(u, n) * q * ds(3)
+        forcing = None
+    else:
+        raise ValueError("Unknown boundary condition type: %s" % bctype)
+    return B, forcing
+
+
+def friction_term(config, u, v, tf=None, u_coef=None):
+    ''' Returns the bottom and turbine friction term of the residual. The quadratic friction coefficient is computed
+        with u_coef, which defaults to u and is the lagged velocity of the linearised schemes. '''
+    params = config.params
+    friction = params["friction"]
+    depth = params["depth"]
+    if params["quadratic_friction"]:
+        if u_coef is None:
+            u_coef = u
+        R = friction / depth * dot(u_coef, u_coef) ** 0.5 * inner(u, v) * dx
+        if tf is not None:
+            R += tf / depth * dot(u_coef, u_coef) ** 0.5 * inner(u, v) * config.site_dx(1)
+    else:
+        R = friction / depth * inner(u, v) * dx
+        if tf is not None:
+            R += tf / depth * inner(u, v) * config.site_dx(1)
+    return R
+
+
+def advection_term(u, v, u_adv=None):
+    ''' Returns the advection term of the residual. The advecting velocity u_adv defaults to u and is the lagged
+        velocity of the linearised schemes. '''
+    if u_adv is None:
+        u_adv = u
+    return inner(dot(grad(u), u_adv), v) * dx
+
+
+def diffusion_term(config, u, v):
+    ''' Returns the diffusion term of the residual. '''
+    # Check that we are not using a DG velocity function space, as the facet integrals are not implemented.
+    if "Discontinuous" in str(config.function_space.split()[0]):
+        raise NotImplementedError("The diffusion term for discontinuous elements is not implemented yet.")
+    return config.params["diffusion_coef"] * inner(grad(u), grad(v)) * dx
+
+
+def spatial_residual(config, u, h, v, q, tf=None, u_source=None, bc_expr=None):
+    ''' Returns the residual R(u, h) of the semi-discrete shallow water equations M d(u, h)/dt + R(u, h) = 0,
+        tested with (v, q). bc_expr replaces the expression of the weak boundary conditions. sw_solve builds its
+        time discretisations from the same terms. '''
+    params = config.params
+
+    R = gravity_wave_terms(config, u, h, v, q)
+    B, forcing = boundary_terms(config, u, h, q, bc_expr)
+    if B is not None:
+        R += B
+    if forcing is not None:
+        R += forcing
+    R += friction_term(config, u, v, tf)
+    if params["include_advection"]:
+        R += advection_term(u, v)
+    if params["include_diffusion"]:
+        R += diffusion_term(config, u, v)
+    if u_source:
+        R -= inner(u_source, v) * dx
+
+    return R
+
+
+@with_assembly_threads
 def sw_solve(config, state, turbine_field=None, functional=None, annotate=True, u_source=None):
     '''Solve the shallow water equations with the parameters specified in params.
        Options for linear_solver and preconditioner are:
         linear_solver: lu, cholesky, cg, gmres, bicgstab, minres, tfqmr, richardson
-        preconditioner: none, ilu, icc, jacobi, bjacobi, sor, amg, additive_schwarz, hypre_amg, hypre_euclid, hypre_parasails, ml_amg
+        preconditioner: none, ilu, icc, jacobi, bjacobi, sor, amg, additive_schwarz, hypre_amg, hypre_euclid, hypre_parasails, ml_amg, fieldsplit
+       The fieldsplit preconditioner uses algebraic multigrid on the velocity block and a Schur complement approximation
+       for the free-surface block. It requires petsc4py and a Krylov linear_solver such as gmres.
     '''
 
     ############################### Setting up the equations ###########################
 
     # Define variables for all used parameters
-    ds = config.domain.ds
     params = config.params
 
     # To begin with, check if the provided parameters are valid
@@ -107,8 +250,6 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
 
     theta = params["theta"]
     dt = params["dt"]
-    g = params["g"]
-    depth = params["depth"]
     # Reset the time
     params["current_time"] = params["start_time"]
     t = params["current_time"]
@@ -116,22 +257,25 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
     include_advection = params["include_advection"]
     include_diffusion = params["include_diffusion"]
     include_time_term = params["include_time_term"]
-    diffusion_coef = params["diffusion_coef"]
     newton_solver = params["newton_solver"]
     picard_relative_tolerance = params["picard_relative_tolerance"]
     picard_iterations = params["picard_iterations"]
+    picard_acceleration = params["picard_acceleration"]
     linear_solver = params["linear_solver"]
     preconditioner = params["preconditioner"]
     bctype = params["bctype"]
     strong_bc = params["strong_bc"]
-    free_slip_on_sides = params["free_slip_on_sides"]
     steady_state = params["steady_state"]
     functional_final_time_only = params["functional_final_time_only"]
     functional_quadrature_degree = params["functional_quadrature_degree"]
     is_nonlinear = (include_advection or quadratic_friction)
     turbine_thrust_parametrisation = params["turbine_thrust_parametrisation"]
     implicit_turbine_thrust_parametrisation = params["implicit_turbine_thrust_parametrisation"]
+    segregated_thrust_solve = params["segregated_thrust_solve"] and (turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation)
     cache_forward_state = params["cache_forward_state"]
+    if cache_forward_state:
+        state_cache = config.state_cache
+        state_cache.update(config)
 
     if not 0 <= functional_quadrature_degree <= 1:
         raise ValueError("functional_quadrature_degree must be 0 or 1.")
@@ -149,13 +293,55 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
         params["finish_time"] = params["start_time"] + dt / 2
         theta = 1.
 
+    # The IMEX scheme treats the advection and optionally the quadratic friction explicitly
+    imex = params["imex"] and is_nonlinear and not steady_state
+    imex_explicit_friction = imex and quadratic_friction and params["imex_explicit_friction"]
+    if imex and (turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation):
+        raise NotImplementedError("The IMEX scheme does not support the thrust turbine parametrisations.")
+    # If the implicit operator is constant, it is assembled and factorised once
+    constant_operator = not is_nonlinear or (imex and (imex_explicit_friction or not quadratic_friction))
+    if constant_operator and not imex_explicit_friction and "dynamic_turbine_friction" in params["controls"]:
+        # The preassembled matrices contain the turbine friction, which changes in every timestep
+        raise NotImplementedError("The preassembled linear solver does not support a dynamic turbine friction control. Use quadratic friction or the explicit IMEX friction.")
+    if annotate and picard_acceleration > 0 and is_nonlinear and not newton_solver and not imex:
+        # The accelerated iterate is combined with vector operations that dolfin-adjoint does not record
+        raise NotImplementedError("The Anderson acceleration of the Picard iteration can not be annotated. Use picard_acceleration=0 or annotate=False.")
+
+    adaptive_timestepping = params["adaptive_timestepping"] and not steady_state
+    if adaptive_timestepping:
+        if not (is_nonlinear and newton_solver) or imex:
+            raise ValueError("Adaptive timestepping requires a nonlinear problem and the newton solver.")
+        if "dynamic_turbine_friction" in params["controls"]:
+            raise ValueError("Adaptive timestepping can not be used with a dynamic turbine friction control.")
+        if params["print_individual_turbine_power"]:
+            raise NotImplementedError("The individual turbine power is not implemented for adaptive timestepping.")
+        if functional_quadrature_degree == 0 and not functional_final_time_only:
+            # The adjoint functional is constructed from the fixed timesteps
+            raise NotImplementedError("Adaptive timestepping requires functional_quadrature_degree=1 or functional_final_time_only=True.")
+        dt_min = params["dt_min"] if params["dt_min"] is not None else dt / 100
+        dt_max = params["dt_max"] if params["dt_max"] is not None else float("inf")
+        if not 0 < dt_min <= dt <= dt_max:
+            raise ValueError("The timestep bounds must satisfy 0 < dt_min <= dt <= dt_max.")
+        # The timestep is an expression so that it can change without recompiling the forms.
+        # dolfin-adjoint records its value for each timestep, as it does for the boundary condition time.
+        dt_form = Expression("dt", dt=dt, degree=0)
+    else:
+        dt_form = dt
+
+    checkpoint_period = params["forward_checkpoint_period"]
+    resume = params["resume_from_forward_checkpoint"]
+    if resume and (steady_state or annotate):
+        # The annotation of the timesteps before the checkpoint would be missing
+        raise ValueError("Only unsteady forward runs without annotation can be resumed from a checkpoint.")
+
     # Define test functions
+    w_test = TestFunction(function_space)
     if implicit_turbine_thrust_parametrisation:
-        v, q, o, o_adv = TestFunctions(function_space)
+        v, q, o, o_adv = split(w_test)
     elif turbine_thrust_parametrisation:
-        v, q, o = TestFunctions(function_space)
+        v, q, o = split(w_test)
     else:
-        v, q = TestFunctions(function_space)
+        v, q = split(w_test)
 
     # Define functions
     state_new = Function(function_space, name="New_state")  # solution of the next timestep
@@ -165,7 +351,7 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
         raise NotImplementedError("Thrust turbine representation does currently only work with the newton solver.")
 
     # Split mixed functions
-    if is_nonlinear and newton_solver:
+    if is_nonlinear and newton_solver and not imex:
         if implicit_turbine_thrust_parametrisation:
             u, h, up_u, up_u_adv = split(state_new)
         elif turbine_thrust_parametrisation:
@@ -191,14 +377,11 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
     h_mid = (1.0 - theta) * h0 + theta * h
 
     # If a picard iteration is used we need an intermediate state
-    if is_nonlinear and not newton_solver:
+    if is_nonlinear and not newton_solver and not imex:
         u_nl, h_nl = split(state_nl)
         state_nl.assign(state, annotate=annotate)
         u_mid_nl = (1.0 - theta) * u0 + theta * u_nl
 
-    # The normal direction
-    n = FacetNormal(function_space.mesh())
-
     # Mass matrix
 
     M = inner(v, u) * dx
@@ -206,51 +389,11 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
     M0 = inner(v, u0) * dx
     M0 += inner(q, h0) * dx
 
-    # Divergence term.
-    Ct_mid = -depth * inner(u_mid, grad(q)) * dx
-    #+inner(avg(u_mid),jump(q,n))*dS # This term is only needed for dg element pairs
-
-    if bctype == 'dirichlet':
-        if steady_state:
-            raise ValueError("Can not use a time dependent boundary condition for a steady state simulation")
-        # The dirichlet boundary condition on the left hand side
-        expr = config.params["weak_dirichlet_bc_expr"]
-        bc_contr = - depth * dot(expr, n) * q * ds(1)
-
-        # The dirichlet boundary condition on the right hand side
-        bc_contr -= depth * dot(expr, n) * q * ds(2)
-
-        # We enforce a no-normal flow on the sides by removing the surface integral.
-        # bc_contr -= dot(u_mid, n) * q * ds(3)
-
-    elif bctype == 'flather':
-        if steady_state:
-            raise ValueError("Can not use a time dependent boundary condition for a steady state simulation")
-        # The Flather boundary condition on the left hand side
-        expr = config.params["flather_bc_expr"]
-        bc_contr = - depth * dot(expr, n) * q * ds(1)
-        Ct_mid += sqrt(g * depth) * inner(h_mid, q) * ds(1)
-
-        # The contributions of the Flather boundary condition on the right hand side
-        Ct_mid += sqrt(g * depth) * inner(h_mid, q) * ds(2)
-
-    elif bctype == 'strong_dirichlet':
-        # Do not replace anything in the surface integrals as the strong Dirichlet Boundary condition will do that
-        bc_contr = -depth * dot(u_mid, n) * q * ds(1)
-        bc_contr -= depth * dot(u_mid, n) * q * ds(2)
-        if not free_slip_on_sides:
-            bc_contr -= depth * dot(u_mid, n) * q * ds(3)
-
-    else:
-        info_red("Unknown boundary condition type: %s" % bctype)
-        sys.exit(1)
-
-    # Pressure gradient operator
-    C_mid = g * inner(v, grad(h_mid)) * dx
-    #+inner(avg(v),jump(h_mid,n))*dS # This term is only needed for dg element pairs
-
-    # Bottom friction
-    friction = params["friction"]
+    # Pressure gradient, divergence and boundary terms
+    G_mid = gravity_wave_terms(config, u_mid, h_mid, v, q)
+    B_mid, bc_forcing = boundary_terms(config, u_mid, h_mid, q)
+    if B_mid is not None:
+        G_mid += B_mid
 
     if turbine_field:
         if type(turbine_field) == list:
@@ -267,72 +410,56 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
             elif turbine_thrust_parametrisation:
                 up_u_eq = upstream_u_equation(config, tf, u, up_u, o)
 
-            def thrust_force(up_u, min=smooth_uflmin):
-                ''' Returns the thrust force for a given upstream velcocity '''
-                # Now apply a pointwise transformation based on the interpolation of a loopup table
-                c_T_coeffs = [0.08344535, -1.42428216, 9.13153605, -26.19370168, 28.8752054]
-                c_T_coeffs.reverse()
-                c_T = min(0.88, sum([c_T_coeffs[i] * up_u ** i for i in range(len(c_T_coeffs))]))
-
-                # The amount of forcing we want to apply
-                turbine_radius = 15.
-                A_c = pi * Constant(turbine_radius ** 2)  # Turbine cross section
-                f = 0.5 * c_T * up_u ** 2 * A_c
-                return f
-
             # Apply the force in the opposite direction of the flow
             f_dir = -thrust_force(up_u) * u / norm_approx(u, alpha=1e-6)
             # Distribute this force over the turbine area
             thrust = inner(f_dir * tf / (Constant(config.turbine_cache.turbine_integral()) * config.params["depth"]), v) * dx
 
-    # Friction term
-    # With Newton we can simply use a non-linear form
-    if quadratic_friction and newton_solver:
-        R_mid = friction / depth * dot(u_mid, u_mid) ** 0.5 * inner(u_mid, v) * dx
-
-        if turbine_field and not (turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation):
-            R_mid += tf / depth * dot(u_mid, u_mid) ** 0.5 * inner(u_mid, v) * config.site_dx(1)
-
+    # Friction term. The turbine friction is replaced by the thrust in the thrust parametrisations.
+    tf_friction = tf if turbine_field and not (turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation) else None
+    # With the IMEX scheme the friction coefficient is lagged. The friction is either explicit or semi-implicit
+    if quadratic_friction and imex:
+        u_fr = u0 if imex_explicit_friction else u_mid
+        R_mid = friction_term(config, u_fr, v, tf_friction, u_coef=u0)
     # With a picard iteration we need to linearise using the best guess
     elif quadratic_friction and not newton_solver:
-        R_mid = friction / depth * dot(u_mid_nl, u_mid_nl) ** 0.5 * inner(u_mid, v) * dx
-
-        if turbine_field and not (turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation):
-            R_mid += tf / depth * dot(u_mid_nl, u_mid_nl) ** 0.5 * inner(u_mid, v) * config.site_dx(1)
-
-    # Use a linear drag
+        R_mid = friction_term(config, u_mid, v, tf_friction, u_coef=u_mid_nl)
+    # With Newton we can simply use a non-linear form
     else:
-        R_mid = friction / depth * inner(u_mid, v) * dx
-
-        if turbine_field and not (turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation):
-            R_mid += tf / depth * inner(u_mid, v) * config.site_dx(1)
+        R_mid = friction_term(config, u_mid, v, tf_friction)
 
     # Advection term
+    # With the IMEX scheme the advection is explicit
+    if include_advection and imex:
+        Ad_mid = advection_term(u0, v)
     # With a newton solver we can simply use a quadratic form
-    if include_advection and newton_solver:
-        Ad_mid = inner(dot(grad(u_mid), u_mid), v) * dx
+    elif include_advection and newton_solver:
+        Ad_mid = advection_term(u_mid, v)
     # With a picard iteration we need to linearise using the best guess
-    if include_advection and not newton_solver:
-        Ad_mid = inner(dot(grad(u_mid), u_mid_nl), v) * dx
-
-    if include_diffusion:
-        # Check that we are not using a DG velocity function space, as the facet integrals are not implemented.
-        if "Discontinuous" in str(function_space.split()[0]):
-            raise NotImplementedError("The diffusion term for discontinuous elements is not implemented yet.")
-        D_mid = diffusion_coef * inner(grad(u_mid), grad(v)) * dx
+    elif include_advection and not newton_solver:
+        Ad_mid = advection_term(u_mid, v, u_adv=u_mid_nl)
 
     # Create the final form
-    G_mid = C_mid + Ct_mid + R_mid
+    # The explicit terms of the IMEX scheme
+    E_mid = None
+    if imex_explicit_friction:
+        E_mid = R_mid
+    else:
+        G_mid += R_mid
     # Add the advection term
-    if include_advection:
+    if include_advection and imex:
+        E_mid = Ad_mid if E_mid is None else E_mid + Ad_mid
+    elif include_advection:
         G_mid += Ad_mid
     # Add the diffusion term
     if include_diffusion:
-        G_mid += D_mid
+        G_mid += diffusion_term(config, u_mid, v)
     # Add the source term
     if u_source:
         G_mid -= inner(u_source, v) * dx
-    F = dt * G_mid - dt * bc_contr
+    F = dt_form * G_mid
+    if bc_forcing is not None:
+        F += dt_form * bc_forcing
     # Add the time term
     if include_time_term and not steady_state:
         F += M - M0
@@ -342,19 +469,153 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
         if turbine_field:
             F -= thrust
 
+    if E_mid is not None:
+        # Keep the part of the form that is linear in the previous state for the preassembly
+        F_linear = F
+        F = F_linear + dt * E_mid
+    else:
+        F_linear = F
+
+    # The solvers keep their matrix tensors and symbolic factorisations alive for the lifetime of the configuration
+    if is_nonlinear and newton_solver and not imex:
+        nonlinear_solver = config.solver_cache.newton_solver("shallow_water", function_space, linear_solver, preconditioner)
+        newton_solvers = [nonlinear_solver]
+
+        if segregated_thrust_solve:
+            # Solve the upstream velocity equations separately from the shallow water equations
+            if not turbine_field:
+                raise ValueError("The segregated thrust solve requires a turbine field.")
+            if implicit_turbine_thrust_parametrisation:
+                up_space = config.upstream_function_space_implicit
+                up_subspaces = [2, 3]
+            else:
+                up_space = config.upstream_function_space
+                up_subspaces = [2]
+            # The fieldsplit preconditioner only applies to the velocity/free-surface block
+            up_preconditioner = "default" if preconditioner == "fieldsplit" else preconditioner
+            blocks = [([0, 1], config.function_space, preconditioner), (up_subspaces, up_space, up_preconditioner)]
+            thrust_solver = config.solver_cache.block_gauss_seidel_solver("shallow_water", function_space, blocks, linear_solver, preconditioner)
+            thrust_solver.parameters["relative_tolerance"] = params["segregated_thrust_tolerance"]
+            thrust_constraints = [[], [turbine_support_constraint(up_space, tf)]]
+            newton_solvers += [solver for (subspaces, V, solver) in thrust_solver.blocks]
+
+        for solver in newton_solvers:
+            solver.parameters["error_on_nonconvergence"] = True
+            solver.parameters["maximum_iterations"] = 20
+            solver.parameters["relative_tolerance"] = 1e-16
+            solver.parameters["line_search"] = params["newton_line_search"]
+            solver.parameters["maximum_retries"] = params["newton_damped_retries"]
+    else:
+        lsolver = config.solver_cache.linear_solver("shallow_water", function_space, linear_solver, preconditioner)
+
     # Preassemble the lhs if possible
-    use_lu_solver = (linear_solver == "lu")
-    if not is_nonlinear:
-        lhs_preass = assemble(dolfin.lhs(F))
-        # Precompute the LU factorisation
+    use_lu_solver = is_direct_solver(linear_solver) and preconditioner != "fieldsplit"
+    if constant_operator:
+        # The strong boundary conditions replace the matrix rows once. In each timestep
+        # they are then only applied to the right hand side.
+        if bctype == 'strong_dirichlet':
+            lhs_preass = lsolver.assemble(dolfin.lhs(F), strong_bc.bcs)
+        else:
+            lhs_preass = lsolver.assemble(dolfin.lhs(F))
+        # The LU factorisation is computed in the first timestep and reused afterwards
         if use_lu_solver:
             info("Computing the LU factorisation for later use ...")
-            if bctype == 'strong_dirichlet':
-                raise NotImplementedError("Strong boundary condition and reusing LU factorisation is currently not implemented")
-            lu_solver = LUSolver(lhs_preass)
-            lu_solver.parameters["reuse_factorization"] = True
 
-    solver_parameters = {"linear_solver": linear_solver, "preconditioner": preconditioner}
+    # Compile the forms that are assembled in every timestep only once
+    if is_nonlinear and not constant_operator and (not newton_solver or imex):
+        lhs_form = PrecompiledForm(dolfin.lhs(F))
+        rhs_form = PrecompiledForm(dolfin.rhs(F))
+        picard_diff = state_new.vector().copy()
+        if picard_acceleration > 0:
+            anderson = AndersonAcceleration(picard_acceleration)
+            state_accelerated = Function(function_space, name="Accelerated_state")
+    elif constant_operator:
+        # dolfin can't assemble empty forms which can sometimes happen here.
+        # A simple workaround is to add a dummy term:
+        dummy_term = Constant(0) * q * dx
+        rhs_ufl = dolfin.rhs(F + dummy_term)
+        # The right hand side is linear in the previous state. Hence we compute it as the product of
+        # a precomputed matrix with the state plus a forcing vector with the boundary and source terms.
+        # With the IMEX scheme the forcing vector contains the explicit terms as well.
+        explicit_matrix = dolfin.assemble(derivative(dolfin.rhs(F_linear + dummy_term), state, TrialFunction(function_space)))
+        forcing = dummy_term
+        if bc_forcing is not None:
+            forcing -= dt * bc_forcing
+        if u_source:
+            forcing += dt * inner(u_source, v) * dx
+        if E_mid is not None:
+            forcing -= dt * E_mid
+        forcing_form = PrecompiledForm(forcing)
+        rhs_preass = state_new.vector().copy()
+
+    def update_time(t, dt):
+        ''' Updates the boundary conditions and the source term for the timestep that ends at time t. '''
+        if adaptive_timestepping:
+            dt_form.dt = dt
+        if bctype == "strong_dirichlet":
+            strong_bc.update_time(t)
+        else:
+            expr.t = t - (1.0 - theta) * dt
+        if u_source:
+            u_source.t = t - (1.0 - theta) * dt
+
+    def newton_solve(annotate):
+        ''' Solves the timestep with the Newton solver, using state_new as the initial guess. '''
+        bcs = strong_bc.bcs if bctype == 'strong_dirichlet' else []
+        if segregated_thrust_solve:
+            thrust_solver.solve(F, state_new, bcs=bcs, constraints=thrust_constraints, annotate=annotate)
+        else:
+            nonlinear_solver.solve(F, state_new, bcs=bcs, annotate=annotate)
+
+    def set_vector(x, y):
+        ''' Copies the values of the vector y into x without annotation. '''
+        x.zero()
+        x.axpy(1.0, y)
+
+    def adaptive_step(t, dt):
+        ''' Chooses the size of the timestep that starts at time t with a step doubling estimate of the local error.
+            The trial solves are not annotated. On exit, state_new contains the solution of the accepted timestep.
+            Returns the accepted timestep and the proposed size of the next one. '''
+        # The order of the theta scheme
+        order = 2 if theta == 0.5 else 1
+        x_old = state.vector().copy()
+        dt = min(dt, params["finish_time"] - t)
+
+        while True:
+            # One full step
+            update_time(t + dt, dt)
+            state_new.assign(state, annotate=False)
+            newton_solve(annotate=False)
+            x_full = state_new.vector().copy()
+
+            # Two half steps
+            update_time(t + 0.5 * dt, 0.5 * dt)
+            state_new.assign(state, annotate=False)
+            newton_solve(annotate=False)
+            set_vector(state.vector(), state_new.vector())
+            update_time(t + dt, 0.5 * dt)
+            newton_solve(annotate=False)
+            set_vector(state.vector(), x_old)
+
+            # Richardson estimate of the error of the full step
+            x_diff = x_full.copy()
+            x_diff.axpy(-1.0, state_new.vector())
+            error = x_diff.norm("l2") / max(state_new.vector().norm("l2"), DOLFIN_EPS) * 2 ** order / (2 ** order - 1)
+            if error > 0:
+                factor = min(2.0, max(0.2, 0.9 * (params["adaptive_timestepping_tolerance"] / error) ** (1. / (order + 1))))
+            else:
+                factor = 2.0
+            info_blue("Adaptive timestepping: dt = %g, estimated local error = %g." % (dt, error))
+
+            if error <= params["adaptive_timestepping_tolerance"] or dt <= dt_min:
+                if error > params["adaptive_timestepping_tolerance"]:
+                    info_red("Adaptive timestepping: the error tolerance is not met with the minimum timestep %g." % dt_min)
+                # Accept the full step, so that every timestep is recorded with a single solve
+                set_vector(state_new.vector(), x_full)
+                return dt, min(max(dt * factor, dt_min), dt_max)
+
+            # Reject the step and retry with a smaller timestep
+            dt = max(dt * factor, dt_min)
 
     # Do some parameter checking:
     if "dynamic_turbine_friction" in params["controls"]:
@@ -365,6 +626,11 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
 
     ############################### Perform the simulation ###########################
 
+    # The checkpoint is loaded before the initial state is written. A resumed run continues the output of the
+    # interrupted run, which already contains the initial state.
+    if resume:
+        values = forward_checkpoint.load_forward_checkpoint(config, state)
+
     if params["dump_period"] > 0:
         try:
             statewriter_cb = config.statewriter_callback
@@ -372,13 +638,17 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
             statewriter_cb = None 
 
         writer = StateWriter(config, optimisation_iteration=config.optimisation_iteration, callback=statewriter_cb)
-        if not steady_state and include_time_term:
+        if not steady_state and include_time_term and not resume:
             print0("Writing state to disk...")
             writer.write(state)
 
     step = 0
 
     if functional is not None:
+        Jt_form = PrecompiledForm(functional.Jt(state, tf))
+        if params["print_individual_turbine_power"]:
+            turbine_contributions = IndividualTurbineContributions(functional, state)
+
         if steady_state or functional_final_time_only:
             j = 0.
             if params["print_individual_turbine_power"]:
@@ -390,93 +660,109 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
                 quad = 0.0
             else:
                 quad = 0.5
-            j = dt * quad * assemble(functional.Jt(state, tf))
+            Jt_old = Jt_form.assemble()
+            if adaptive_timestepping:
+                # The trapezoidal rule is accumulated in each timestep
+                j = 0.
+            else:
+                j = dt * quad * Jt_old
             if params["print_individual_turbine_power"]:
-                j_individual = []
-                force_individual = []
-                for i in range(len(params["turbine_pos"])):
-                    j_individual.append(dt * quad * assemble(functional.Jt_individual(state, i)))
-                    force_individual.append(dt * quad * assemble(functional.force_individual(state, i)))
+                j_individual = [dt * quad * p for p in turbine_contributions.power()]
+                force_individual = [dt * quad * f for f in turbine_contributions.force()]
+
+    observers = observer_list(params["observers"])
 
-    print0("Start of time loop")
-    adjointer.time.start(t)
     timestep = 0
-    while (t < params["finish_time"]):
-        timestep += 1
-        t += dt
+    dt_next = dt
+    if resume:
+        t = float(values["t"])
         params["current_time"] = t
+        timestep = int(values["timestep"])
+        step = int(values["step"])
+        dt_next = float(values["dt_next"])
+        if functional is not None:
+            j = float(values["j"])
+            if "Jt_old" in values:
+                Jt_old = float(values["Jt_old"])
+            if params["print_individual_turbine_power"]:
+                j_individual = values["j_individual"].tolist()
+                force_individual = values["force_individual"].tolist()
+        # The nonlinear solvers start from the most recent state, as in the uninterrupted run
+        state_new.assign(state, annotate=False)
+        state_nl.assign(state, annotate=False)
+        if turbine_field and type(turbine_field) == list:
+            tf.assign(turbine_field[timestep], annotate=False)
 
-        # Update bc's
-        if bctype == "strong_dirichlet":
-            strong_bc.update_time(t)
-        else:
-            expr.t = t - (1.0 - theta) * dt
-        # Update source term
-        if u_source:
-            u_source.t = t - (1.0 - theta) * dt
-        step += 1
-
-        # Solve non-linear system with a Newton sovler
-        if is_nonlinear and newton_solver:
-            # Use a Newton solver to solve the nonlinear problem.
-            #solver_parameters["linear_solver"] = "gmres"
-            #solver_parameters["linear_solver"] = "superlu_dist"
-            #solver_parameters["preconditioner"] = "ilu" # does not work in parallel
-            #solver_parameters["preconditioner"] = "amg"
-            #solver_parameters["linear_solver"] = "mumps"
-            #solver_parameters["linear_solver"] = "umfpack"
-            solver_parameters["newton_solver"] = {}
-            solver_parameters["newton_solver"]["error_on_nonconvergence"] = True
-            solver_parameters["newton_solver"]["maximum_iterations"] = 20
-            solver_parameters["newton_solver"]["convergence_criterion"] = "incremental"
-            solver_parameters["newton_solver"]["relative_tolerance"] = 1e-16
-
-            if cache_forward_state and state_cache.has_key(t):
-                print0("Load initial guess from cache for time %f." % t)
-                # Load initial guess for solver from cache
-                state_new.assign(state_cache[t], annotate=False)
-            elif not include_time_term:
-                print0("Set the initial guess for the nonlinear solver to the initial condition.")
-                # Reset the initial guess after each timestep
-                ic = config.params['initial_condition']
-                state_new.assign(ic, annotate=False)
-
-            info_blue("Solve shallow water equations at time %s (Newton iteration) ..." % params["current_time"])
-            if bctype == 'strong_dirichlet':
-                solve(F == 0, state_new, bcs=strong_bc.bcs, solver_parameters=solver_parameters, annotate=annotate)
-            else:
-                solve(F == 0, state_new, solver_parameters=solver_parameters, annotate=annotate)
-
-            if turbine_thrust_parametrisation or implicit_turbine_thrust_parametrisation:
-                print0("Inflow velocity: ", u[0]((10, 160)))
-                print0("Estimated upstream velocity: ", up_u((640. / 3, 160)))
-                print0("Expected thrust force: ", thrust_force(u[0]((10, 160)), min=min)((0)))
-                print0("Total amount of thurst force applied: ", assemble(inner(Constant(1), thrust_force(up_u) * tf / config.turbine_cache.turbine_integral()) * dx))
-
-                us.append(u[0]((10, 160)))
-                thrusts.append(thrust_force(u[0]((10, 160)))((0)))
-                thrusts_est.append(assemble(inner(Constant(1), thrust_force(up_u) * tf / config.turbine_cache.turbine_integral()) * dx))
-
-                import matplotlib.pyplot as plt
-                plt.clf()
-                plt.plot(us, thrusts, label="Analytical")
-                plt.plot(us, thrusts_est, label="Approximated")
-                plt.legend(loc=2)
-                plt.savefig("thrust_plot.pdf", format='pdf')
-
-        # Solve non-linear system with a Picard iteration
-        elif is_nonlinear:
-            # Solve the problem using a picard iteration
-            iter_counter = 0
-            while True:
-                info_blue("Solving shallow water equations at time %s (Picard iteration %d) ..." % (params["current_time"], iter_counter))
-                if bctype == 'strong_dirichlet':
-                    solve(dolfin.lhs(F) == dolfin.rhs(F), state_new, bcs=strong_bc.bcs, solver_parameters=solver_parameters)
-                else:
-                    solve(dolfin.lhs(F) == dolfin.rhs(F), state_new, solver_parameters=solver_parameters, annotate=annotate)
-                iter_counter += 1
-                if iter_counter > 0:
-                    relative_diff = abs(assemble(inner(state_new - state_nl, state_new - state_nl) * dx)) / assemble(inner(state_new, state_new) * dx)
+    print0("Start of time loop")
+    # The observers are finalized also if a solve fails, so that their background threads do not outlive the run
+    time_loop_failed = True
+    try:
+        adjointer.time.start(t)
+        while (t < params["finish_time"]):
+            timestep += 1
+            if adaptive_timestepping:
+                dt, dt_next = adaptive_step(t, dt_next)
+            t += dt
+            params["current_time"] = t
+
+            # Update bc's and source term
+            update_time(t, dt)
+            step += 1
+
+            if adaptive_timestepping:
+                # state_new contains the solution of the accepted timestep, which only needs to be recorded
+                if annotate:
+                    nonlinear_solver.record(F, state_new, bcs=strong_bc.bcs if bctype == 'strong_dirichlet' else [])
+
+            # Solve non-linear system with a Newton sovler
+            elif is_nonlinear and newton_solver and not imex:
+                # Use a Newton solver to solve the nonlinear problem.
+                if cache_forward_state and state_cache.load(timestep, state_new):
+                    # Loaded the initial guess for solver from cache
+                    print0("Load initial guess from cache for time %f." % t)
+                elif not include_time_term:
+                    print0("Set the initial guess for the nonlinear solver to the initial condition.")
+                    # Reset the initial guess after each timestep
+                    ic = config.params['initial_condition']
+                    state_new.assign(ic, annotate=False)
+
+                info_blue("Solve shallow water equations at time %s (Newton iteration) ..." % params["current_time"])
+                newton_solve(annotate)
+
+            # Solve the IMEX timestep with the semi-implicit friction, whose operator changes in every timestep
+            elif imex and not constant_operator:
+                info_blue("Solving shallow water equations at time %s (IMEX) ..." % (params["current_time"]))
+                bcs = strong_bc.bcs if bctype == 'strong_dirichlet' else []
+                lsolver.assemble(lhs_form, bcs)
+                rhs_imex = rhs_form.assemble(annotate=annotate)
+                for bc in bcs:
+                    bc.apply(rhs_imex)
+                lsolver.solve(state_new.vector(), rhs_imex, annotate=annotate)
+
+            # Solve non-linear system with a Picard iteration
+            elif is_nonlinear and not imex:
+                # Solve the problem using a picard iteration
+                iter_counter = 0
+                if picard_acceleration > 0:
+                    anderson.reset()
+                while True:
+                    info_blue("Solving shallow water equations at time %s (Picard iteration %d) ..." % (params["current_time"], iter_counter))
+                    if bctype == 'strong_dirichlet':
+                        bcs = strong_bc.bcs
+                    else:
+                        bcs = []
+                    lsolver.assemble(lhs_form, bcs)
+                    rhs_nl = rhs_form.assemble(annotate=annotate)
+                    for bc in bcs:
+                        bc.apply(rhs_nl)
+                    lsolver.solve(state_new.vector(), rhs_nl, annotate=annotate)
+                    iter_counter += 1
+
+                    # The relative difference is computed from vector norms to avoid any assembly
+                    picard_diff.zero()
+                    picard_diff.axpy(1.0, state_new.vector())
+                    picard_diff.axpy(-1.0, state_nl.vector())
+                    relative_diff = (picard_diff.norm("l2") / state_new.vector().norm("l2")) ** 2
                     info_blue("Picard iteration " + str(iter_counter) + " relative difference: " + str(relative_diff))
 
                     if relative_diff < picard_relative_tolerance:
@@ -486,78 +772,111 @@ def sw_solve(config, state, turbine_field=None, functional=None, annotate=True,
                         info_red("Picard iteration reached maximum number of iterations (" + str(picard_iterations) + ") with a relative difference of " + str(relative_diff) + ".")
                         break
 
-            state_nl.assign(state_new)
+                    # Update the linearisation point for the next iteration
+                    if picard_acceleration > 0:
+                        x_new = anderson.update(state_nl.vector(), state_new.vector())
+                        state_accelerated.vector().zero()
+                        state_accelerated.vector().axpy(1.0, x_new)
+                        state_nl.assign(state_accelerated, annotate=annotate)
+                    else:
+                        state_nl.assign(state_new, annotate=annotate)
 
-        # Solve linear system with preassembled matrices
-        else:
-            # dolfin can't assemble empty forms which can sometimes happen here.
-            # A simple workaround is to add a dummy term:
-            dummy_term = Constant(0) * q * dx
-            rhs_preass = assemble(dolfin.rhs(F + dummy_term))
-            # Apply dirichlet boundary conditions
-            info_blue("Solving shallow water equations at time %s (preassembled matrices) ..." % (params["current_time"]))
-            if bctype == 'strong_dirichlet':
-                [bc.apply(lhs_preass, rhs_preass) for bc in strong_bc.bcs]
-            if use_lu_solver:
-                info("Using a LU solver to solve the linear system.")
-                lu_solver.solve(state.vector(), rhs_preass, annotate=annotate)
-            else:
-                solve(lhs_preass, state_new.vector(), rhs_preass, solver_parameters["linear_solver"], solver_parameters["preconditioner"], annotate=annotate)
-
-        # After the timestep solve, update state
-        state.assign(state_new)
-        if cache_forward_state:
-            # Save state for initial guess cache
-            print0("Cache initial guess for time %f." % t)
-            if not state_cache.has_key(t):
-                state_cache[t] = Function(state_new.function_space())
-            state_cache[t].assign(state_new, annotate=False)
-
-        # Set the control function for the upcoming timestep.
-        if turbine_field:
-            if type(turbine_field) == list:
-                tf.assign(turbine_field[timestep])
-            else:
-                tf.assign(turbine_field)
-
-        if params["dump_period"] > 0 and step % params["dump_period"] == 0:
-            print0("Write state to disk...")
-            writer.write(state)
+                state_nl.assign(state_new)
 
-        if functional is not None:
-            if not (functional_final_time_only and t < params["finish_time"]):
-                if steady_state or functional_final_time_only or functional_quadrature_degree == 0:
-                    quad = 1.0
-                elif t >= params["finish_time"]:
-                    quad = 0.5 * dt
+            # Solve linear system with preassembled matrices
+            else:
+                explicit_matrix.mult(state.vector(), rhs_preass)
+                rhs_preass.axpy(1.0, forcing_form.assemble())
+                if annotate:
+                    label_tensor(rhs_preass, rhs_ufl)
+                # Apply dirichlet boundary conditions
+                info_blue("Solving shallow water equations at time %s (preassembled matrices) ..." % (params["current_time"]))
+                if bctype == 'strong_dirichlet':
+                    [bc.apply(rhs_preass) for bc in strong_bc.bcs]
+                if use_lu_solver:
+                    info("Using a LU solver to solve the linear system.")
+                lsolver.solve(state_new.vector(), rhs_preass, reuse_factorisation=use_lu_solver, annotate=annotate)
+
+            # After the timestep solve, update state
+            state.assign(state_new)
+            if cache_forward_state:
+                # Save state for initial guess cache
+                print0("Cache initial guess for time %f." % t)
+                state_cache.store(timestep, state_new)
+
+            for observer in observers:
+                observer.notify(timestep, t, state, tf if turbine_field else None)
+
+            # Set the control function for the upcoming timestep.
+            if turbine_field:
+                if type(turbine_field) == list:
+                    tf.assign(turbine_field[timestep])
                 else:
-                    quad = 1.0 * dt
-
-                j += quad * assemble(functional.Jt(state, tf))
-                if params["print_individual_turbine_power"]:
-                    info_green("Computing individual turbine power extraction contribution...")
-                    individual_contribution_list = ['x_pos', 'y_pos', 'turbine_power', 'total_force_on_turbine', 'turbine_friction']
-                    fr_individual = range(len(params["turbine_pos"]))
-                    for i in range(len(params["turbine_pos"])):
-                        j_individual[i] += dt * quad * assemble(functional.Jt_individual(state, i))
-                        force_individual[i] += dt * quad * assemble(functional.force_individual(state, i))
-
-                        if len(params["turbine_friction"]) > 0:
-                            fr_individual[i] = params["turbine_friction"][i]
-                        else:
-                            fr_individual = [params["turbine_friction"]] * len(params["turbine_pos"])
-
-                        individual_contribution_list.append((params["turbine_pos"][i])[0])
-                        individual_contribution_list.append((params["turbine_pos"][i])[1])
-                        individual_contribution_list.append(j_individual[i])
-                        individual_contribution_list.append(force_individual[i])
-                        individual_contribution_list.append(fr_individual[i])
-
-                        print0("Contribution of turbine number %d at co-ordinates:" % (i + 1), params["turbine_pos"][i], ' is: ', j_individual[i] * 0.001, 'kW', 'with friction of', fr_individual[i])
-
-        # Increase the adjoint timestep
-        adj_inc_timestep(time=t, finished=(not t < params["finish_time"]))
+                    tf.assign(turbine_field)
+
+            if params["dump_period"] > 0 and step % params["dump_period"] == 0:
+                print0("Write state to disk...")
+                writer.write(state)
+
+            if functional is not None:
+                if not (functional_final_time_only and t < params["finish_time"]):
+                    if adaptive_timestepping and not (functional_final_time_only or functional_quadrature_degree == 0):
+                        # Trapezoidal rule for variable timesteps
+                        Jt = Jt_form.assemble()
+                        j += 0.5 * dt * (Jt_old + Jt)
+                        Jt_old = Jt
+                        quad = 0.
+                    elif steady_state or functional_final_time_only or functional_quadrature_degree == 0:
+                        quad = 1.0
+                    elif t >= params["finish_time"]:
+                        quad = 0.5 * dt
+                    else:
+                        quad = 1.0 * dt
+
+                    if quad > 0:
+                        j += quad * Jt_form.assemble()
+                    if params["print_individual_turbine_power"]:
+                        info_green("Computing individual turbine power extraction contribution...")
+                        individual_contribution_list = ['x_pos', 'y_pos', 'turbine_power', 'total_force_on_turbine', 'turbine_friction']
+                        fr_individual = range(len(params["turbine_pos"]))
+                        power_contributions = turbine_contributions.power()
+                        force_contributions = turbine_contributions.force()
+                        for i in range(len(params["turbine_pos"])):
+                            j_individual[i] += dt * quad * power_contributions[i]
+                            force_individual[i] += dt * quad * force_contributions[i]
+
+                            if len(params["turbine_friction"]) > 0:
+                                fr_individual[i] = params["turbine_friction"][i]
+                            else:
+                                fr_individual = [params["turbine_friction"]] * len(params["turbine_pos"])
+
+                            individual_contribution_list.append((params["turbine_pos"][i])[0])
+                            individual_contribution_list.append((params["turbine_pos"][i])[1])
+                            individual_contribution_list.append(j_individual[i])
+                            individual_contribution_list.append(force_individual[i])
+                            individual_contribution_list.append(fr_individual[i])
+
+                            print0("Contribution of turbine number %d at co-ordinates:" % (i + 1), params["turbine_pos"][i], ' is: ', j_individual[i] * 0.001, 'kW', 'with friction of', fr_individual[i])
+
+            if checkpoint_period > 0 and timestep % checkpoint_period == 0:
+                # The boundary condition time is restored from t
+                values = {"t": t, "timestep": timestep, "step": step, "dt_next": dt_next}
+                if functional is not None:
+                    values["j"] = j
+                    if not (steady_state or functional_final_time_only):
+                        values["Jt_old"] = Jt_old
+                    if params["print_individual_turbine_power"]:
+                        values["j_individual"] = j_individual
+                        values["force_individual"] = force_individual
+                forward_checkpoint.save_forward_checkpoint(config, state, **values)
+
+            # Increase the adjoint timestep
+            adj_inc_timestep(time=t, finished=(not t < params["finish_time"]))
+        time_loop_failed = False
+    finally:
+        finalize_observers(observers, ignore_errors=time_loop_failed)
     print0("End of time loop.")
+    config.solver_cache.report()
 
     # Write the turbine positions, power extraction and friction to a .csv file named turbine_info.csv
     if params['print_individual_turbine_power']:
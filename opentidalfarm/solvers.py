@@ -0,0 +1,587 @@
+import numpy
+import dolfin
+import ufl
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info, info_blue, info_red
+
+
+def is_direct_solver(linear_solver):
+    ''' Returns True if linear_solver is the name of a direct (LU) solver. '''
+    return linear_solver == "lu" or linear_solver in [m[0] for m in dolfin.lu_solver_methods()]
+
+
+class PrecompiledForm(object):
+    ''' A form that is compiled once and then repeatedly assembled into a preallocated tensor.
+        This avoids the recomputation of the form signature and the allocation of a new tensor in each assembly. '''
+
+    def __init__(self, form):
+        self.ufl_form = form
+        self.form = dolfin.Form(form)
+        self.tensor = None
+
+    def assemble(self, annotate=False):
+        ''' Assembles the form. Functionals return a float and all other forms return the preallocated tensor.
+            If annotate is True, the tensor is labeled with its form such that dolfin-adjoint can record
+            solves that depend on it. '''
+        if self.form.rank() == 0:
+            return dolfin.assemble(self.form)
+
+        if self.tensor is None:
+            self.tensor = dolfin.assemble(self.form)
+        else:
+            dolfin.assemble(self.form, tensor=self.tensor, reset_sparsity=False)
+
+        if annotate:
+            label_tensor(self.tensor, self.ufl_form)
+        return self.tensor
+
+
+def label_tensor(tensor, form):
+    ''' Labels an assembled tensor with the form it was computed from, as dolfin-adjoint's assemble would do. '''
+    tensor.form = form
+    tensor.assemble_system = False
+    tensor.bcs = []
+
+
+class AndersonAcceleration(object):
+    ''' Anderson (DIIS) acceleration for the fixed point iteration x = G(x). The next iterate is the
+        combination of the most recent images G(x) that minimises the fixed point residual G(x) - x
+        over a short history of iterates. '''
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.reset()
+
+    def reset(self):
+        ''' Clears the history, e.g. at the start of a new timestep. '''
+        self.f_prev = None
+        self.G_prev = None
+        self.dF = []
+        self.dG = []
+
+    def update(self, x, Gx):
+        ''' Takes the current iterate x and its image Gx and returns the next iterate. '''
+        f = Gx.copy()
+        f.axpy(-1.0, x)
+
+        if self.f_prev is not None:
+            dF = f.copy()
+            dF.axpy(-1.0, self.f_prev)
+            dG = Gx.copy()
+            dG.axpy(-1.0, self.G_prev)
+            self.dF.append(dF)
+            self.dG.append(dG)
+            if len(self.dF) > self.depth:
+                self.dF.pop(0)
+                self.dG.pop(0)
+
+        self.f_prev = f
+        self.G_prev = Gx.copy()
+
+        x_new = Gx.copy()
+        m = len(self.dF)
+        if m > 0:
+            # Solve the small least squares problem min ||f - dF gamma|| with the (regularised) normal equations.
+            # The inner products are parallel safe.
+            A = numpy.array([[self.dF[i].inner(self.dF[k]) for k in range(m)] for i in range(m)])
+            rhs = numpy.array([self.dF[i].inner(f) for i in range(m)])
+            A += 1e-12 * max(numpy.trace(A), 1e-300) * numpy.eye(m)
+            gamma = numpy.linalg.solve(A, rhs)
+            for i in range(m):
+                x_new.axpy(-gamma[i], self.dG[i])
+        return x_new
+
+
+def fieldsplit_solver(A, function_space, linear_solver="gmres", options_prefix="sw_"):
+    ''' Creates a Krylov solver for the saddle point system A with a Schur complement field-split preconditioner.
+        The velocity block (including all enriched fields) is preconditioned with algebraic multigrid. The Schur
+        complement is preconditioned with algebraic multigrid applied to C - B diag(A)^-1 B^T.
+        The PETSc settings can be overwritten with command line options starting with options_prefix. '''
+    try:
+        from petsc4py import PETSc
+    except ImportError:
+        raise ImportError("The fieldsplit preconditioner requires petsc4py.")
+
+    if linear_solver in ("default", "lu") or is_direct_solver(linear_solver):
+        linear_solver = "gmres"
+
+    # The free-surface is the second field, all other fields are added to the velocity block
+    dofs_h = function_space.sub(1).dofmap().dofs()
+    dofs_u = numpy.concatenate([function_space.sub(i).dofmap().dofs() for i in range(function_space.num_sub_spaces()) if i != 1])
+    is_u = PETSc.IS().createGeneral(numpy.sort(dofs_u).astype(PETSc.IntType), comm=PETSc.COMM_WORLD)
+    is_h = PETSc.IS().createGeneral(numpy.sort(dofs_h).astype(PETSc.IntType), comm=PETSc.COMM_WORLD)
+
+    ksp = PETSc.KSP().create(PETSc.COMM_WORLD)
+    ksp.setOptionsPrefix(options_prefix)
+    ksp.setType(linear_solver)
+    ksp.setTolerances(rtol=1e-10, atol=1e-15, max_it=1000)
+    pc = ksp.getPC()
+    pc.setType(PETSc.PC.Type.FIELDSPLIT)
+    pc.setFieldSplitIS(("u", is_u), ("h", is_h))
+
+    options = PETSc.Options(options_prefix)
+    defaults = {"pc_fieldsplit_type": "schur",
+                "pc_fieldsplit_schur_fact_type": "upper",
+                "pc_fieldsplit_schur_precondition": "selfp",
+                "fieldsplit_u_ksp_type": "preonly",
+                "fieldsplit_u_pc_type": "hypre",
+                "fieldsplit_h_ksp_type": "preonly",
+                "fieldsplit_h_pc_type": "hypre"}
+    for key, value in defaults.iteritems():
+        if not options.hasName(key):
+            options[key] = value
+    ksp.setFromOptions()
+
+    solver = PETScKrylovSolver(ksp)
+    solver.set_operator(as_backend_type(A))
+    return solver
+
+
+class ReusableLinearSolver(object):
+    ''' A linear solver that keeps the matrix tensor and the symbolic factorisation alive between solves.
+        The sparsity pattern is computed on the first assembly only and later solves recompute
+        the numerical factorisation only. '''
+
+    def __init__(self, linear_solver, preconditioner, function_space=None):
+        self.linear_solver = linear_solver
+        self.preconditioner = preconditioner
+        self.function_space = function_space
+        self.A = None
+        self.solver = None
+        # True if the current matrix values have already been factorised
+        self.factorised = False
+        # Solve timings with and without the symbolic analysis phase
+        self.analysis_timings = []
+        self.reuse_timings = []
+
+    def assemble(self, form, bcs=[]):
+        ''' Assembles form into the persistent matrix tensor and applies the boundary conditions to it.
+            form is either a ufl form or a PrecompiledForm. '''
+        reset_sparsity = self.A is None
+        if reset_sparsity:
+            self.A = Matrix()
+        if isinstance(form, PrecompiledForm):
+            dolfin.assemble(form.form, tensor=self.A, reset_sparsity=reset_sparsity)
+            label_tensor(self.A, form.ufl_form)
+        else:
+            assemble(form, tensor=self.A, reset_sparsity=reset_sparsity)
+        for bc in bcs:
+            bc.apply(self.A)
+        self.factorised = False
+        return self.A
+
+    def create_solver(self):
+        if self.preconditioner == "fieldsplit":
+            return fieldsplit_solver(self.A, self.function_space, self.linear_solver)
+        elif is_direct_solver(self.linear_solver):
+            method = "default" if self.linear_solver == "lu" else self.linear_solver
+            solver = LUSolver(self.A, method)
+            solver.parameters["same_nonzero_pattern"] = True
+        else:
+            solver = KrylovSolver(self.A, self.linear_solver, self.preconditioner)
+            solver.parameters["preconditioner"]["same_nonzero_pattern"] = True
+        return solver
+
+    def solve(self, x, b, reuse_factorisation=False, annotate=False):
+        ''' Solves A x = b with the most recently assembled matrix. If reuse_factorisation is True and the matrix
+            has not changed since the last solve, the numerical factorisation is reused as well. '''
+        if self.solver is None:
+            self.solver = self.create_solver()
+            timer = dolfin.Timer("Linear solve (symbolic analysis)")
+            timings = self.analysis_timings
+        else:
+            timer = dolfin.Timer("Linear solve (reused symbolic analysis)")
+            timings = self.reuse_timings
+
+        if self.preconditioner != "fieldsplit" and is_direct_solver(self.linear_solver):
+            self.solver.parameters["reuse_factorization"] = reuse_factorisation and self.factorised
+
+        if self.preconditioner == "fieldsplit":
+            if annotate:
+                raise NotImplementedError("The fieldsplit preconditioner can only be annotated in combination with the Newton solver.")
+            self.solver.solve(x, b)
+        else:
+            self.solver.solve(x, b, annotate=annotate)
+        self.factorised = True
+        timings.append(timer.stop())
+
+    def solver_parameters(self):
+        ''' Returns the dolfin solver parameters that are equivalent to this solver. The field-split preconditioner
+            is not available in dolfin, hence the adjoint of such systems is solved with a direct solver. '''
+        if self.preconditioner == "fieldsplit":
+            return {"linear_solver": "default", "preconditioner": "default"}
+        return {"linear_solver": self.linear_solver, "preconditioner": self.preconditioner}
+
+    def saved_analysis_time(self):
+        ''' Estimates the time that was saved by reusing the symbolic analysis. '''
+        if len(self.analysis_timings) == 0 or len(self.reuse_timings) == 0:
+            return 0.
+        t_analysis = sum(self.analysis_timings) / len(self.analysis_timings)
+        t_reuse = sum(self.reuse_timings) / len(self.reuse_timings)
+        return max(0., t_analysis - t_reuse) * len(self.reuse_timings)
+
+
+class DofConstraint(object):
+    ''' Constrains the given (locally owned, global) dofs to zero. It can be used in place of a homogeneous
+        DirichletBC in the solvers of this module, but not in annotated dolfin solves. '''
+
+    def __init__(self, dofs):
+        self.dofs = numpy.array(dofs, dtype="intc")
+
+    def homogenize(self):
+        pass
+
+    def apply(self, tensor):
+        if isinstance(tensor, GenericMatrix):
+            tensor.ident(self.dofs)
+        else:
+            x = tensor.array()
+            x[self.dofs - tensor.local_range()[0]] = 0.
+            tensor.set_local(x)
+            tensor.apply("insert")
+
+
+def homogenized(bcs):
+    ''' Returns the homogeneous versions of the boundary conditions. '''
+    hbcs = []
+    for bc in bcs:
+        if isinstance(bc, DofConstraint):
+            hbcs.append(bc)
+        else:
+            hbc = DirichletBC(bc)
+            hbc.homogenize()
+            hbcs.append(hbc)
+    return hbcs
+
+
+class ReusableNewtonSolver(object):
+    ''' A Newton solver that assembles the Jacobian into the persistent tensor of a ReusableLinearSolver.
+        The Newton step is globalised with a backtracking line search and a failed solve is retried with
+        an increasingly damped Newton step, starting again from the initial guess.
+        The Newton iterations are not annotated. Instead, the converged solution is recorded
+        with an annotated dolfin solve, which converges without any iteration. '''
+
+    def __init__(self, linear_solver):
+        self.linear_solver = linear_solver
+        self.parameters = {"maximum_iterations": 20,
+                           "relative_tolerance": 1e-16,
+                           "absolute_tolerance": 1e-10,
+                           "error_on_nonconvergence": True,
+                           "relaxation_parameter": 1.0,
+                           "line_search": "bt",
+                           "line_search_maximum_iterations": 10,
+                           "maximum_retries": 3}
+        self.b = Vector()
+        self.du = None
+        # The compiled residual and Jacobian forms of the most recent solve
+        self.forms = None
+        # The total number of Newton iterations performed by this solver
+        self.iterations = 0
+
+    def compiled_forms(self, F, u):
+        ''' Returns the compiled residual and Jacobian forms. They are only recompiled if F has changed. '''
+        if self.forms is None or self.forms[0] is not F or self.forms[1] is not u:
+            J = derivative(F, u)
+            self.forms = (F, u, PrecompiledForm(F), PrecompiledForm(J))
+        return self.forms[2], self.forms[3]
+
+    def residual_norm(self, F, bcs):
+        dolfin.assemble(F.form, tensor=self.b)
+        for bc in bcs:
+            bc.apply(self.b)
+        return self.b.norm("l2")
+
+    def backtrack(self, F, u, bcs, residual_norm, step):
+        ''' Backtracking line search along the Newton direction. The step length is halved until the residual
+            norm decreases sufficiently (Armijo condition). Returns the accepted step length and residual norm. '''
+        x = u.vector()
+        for i in range(self.parameters["line_search_maximum_iterations"]):
+            x.axpy(-step, self.du)
+            new_residual_norm = self.residual_norm(F, bcs)
+            if numpy.isfinite(new_residual_norm) and new_residual_norm <= (1. - 1e-4 * step) * residual_norm:
+                return step, new_residual_norm
+            x.axpy(step, self.du)
+            step *= 0.5
+
+        # Take the smallest step if no sufficient decrease was found
+        info_red("Line search did not find a sufficient decrease of the residual.")
+        x.axpy(-step, self.du)
+        return step, self.residual_norm(F, bcs)
+
+    def newton_iteration(self, F, J, u, bcs, relaxation):
+        ''' Performs the (relaxed) Newton iteration. Returns the number of iterations, the convergence flag and the
+            residual norm of the final iterate. '''
+        params = self.parameters
+        residual_norm = self.residual_norm(F, bcs)
+        residual0 = None
+        iteration = 0
+        while iteration < params["maximum_iterations"]:
+            iteration += 1
+            # self.b contains the residual of the current iterate
+            self.linear_solver.assemble(J, bcs)
+            self.linear_solver.solve(self.du, self.b)
+
+            if params["line_search"] == "bt":
+                step, residual_norm = self.backtrack(F, u, bcs, residual_norm, relaxation)
+            else:
+                step = relaxation
+                u.vector().axpy(-step, self.du)
+                residual_norm = self.residual_norm(F, bcs)
+
+            residual = self.du.norm("l2")
+            if not numpy.isfinite(residual) or not numpy.isfinite(residual_norm):
+                info_red("Newton solver diverged.")
+                return iteration, False, residual_norm
+            if residual0 is None:
+                residual0 = residual
+            relative_residual = residual / residual0 if residual0 > 0 else 0.
+            info("Newton iteration %d: r (abs) = %.3e (tol = %.3e) r (rel) = %.3e (tol = %.3e) step = %.3f" % (iteration, residual, params["absolute_tolerance"], relative_residual, params["relative_tolerance"], step))
+
+            if residual < params["absolute_tolerance"] or relative_residual < params["relative_tolerance"]:
+                return iteration, True, residual_norm
+
+        return iteration, False, residual_norm
+
+    def solve(self, F, u, bcs=[], annotate=True):
+        ''' Solves F(u) = 0 using u as initial guess. Returns the number of Newton iterations and the convergence flag. '''
+        params = self.parameters
+        F_compiled, J_compiled = self.compiled_forms(F, u)
+
+        # The Newton increments satisfy homogeneous boundary conditions
+        for bc in bcs:
+            bc.apply(u.vector())
+        hbcs = homogenized(bcs)
+
+        if self.du is None or self.du.size() != u.vector().size():
+            self.du = u.vector().copy()
+
+        # Keep the initial guess in case the solve has to be restarted
+        initial_guess = u.vector().copy()
+        relaxation = params["relaxation_parameter"]
+        total_iterations = 0
+        for attempt in range(params["maximum_retries"] + 1):
+            if attempt > 0:
+                relaxation *= 0.5
+                info_red("Newton solver failed. Restarting from the initial guess with relaxation parameter %f." % relaxation)
+                u.vector().zero()
+                u.vector().axpy(1.0, initial_guess)
+            try:
+                iteration, converged, residual_norm = self.newton_iteration(F_compiled, J_compiled, u, hbcs, relaxation)
+            except RuntimeError as e:
+                # The linear solver failed
+                info_red("Newton solver failed: %s" % e)
+                iteration, converged = 0, False
+            total_iterations += iteration
+            if converged:
+                break
+
+        self.iterations += total_iterations
+        if converged:
+            info("Newton solver finished in %d iterations." % total_iterations)
+        elif params["error_on_nonconvergence"]:
+            raise RuntimeError("Newton solver did not converge after %d iterations." % total_iterations)
+        else:
+            info_red("Newton solver did not converge after %d iterations." % total_iterations)
+            residual_norm = self.residual_norm(F_compiled, hbcs)
+
+        if annotate:
+            self.record(F, u, bcs, residual_norm)
+
+        return total_iterations, converged
+
+    def record(self, F, u, bcs=[], residual_norm=None):
+        ''' Records the solve of F(u) = 0 for the adjoint, where u has already been computed without annotation.
+            Since u already solves the problem, the recorded Newton solve stops before its first iteration. '''
+        params = self.parameters
+        F_compiled, J_compiled = self.compiled_forms(F, u)
+        if residual_norm is None:
+            residual_norm = self.residual_norm(F_compiled, homogenized(bcs))
+
+        solver_parameters = {"newton_solver": {"convergence_criterion": "residual",
+                                               "absolute_tolerance": max(1.1 * residual_norm, params["absolute_tolerance"]),
+                                               "relative_tolerance": params["relative_tolerance"],
+                                               "maximum_iterations": params["maximum_iterations"],
+                                               "error_on_nonconvergence": params["error_on_nonconvergence"]}}
+        solver_parameters.update(self.linear_solver.solver_parameters())
+        solve(F == 0, u, bcs=bcs, J=J_compiled.ufl_form, solver_parameters=solver_parameters, annotate=True)
+
+
+def value_size(function_space):
+    ''' Returns the number of scalar components of the functions in function_space. '''
+    return int(numpy.prod(function_space.ufl_element().value_shape()))
+
+
+def components(f):
+    ''' Returns the list of scalar components of a ufl function or argument. '''
+    if f.shape() == ():
+        return [f]
+    return [f[i] for i in range(numpy.prod(f.shape()))]
+
+
+class BlockGaussSeidelSolver(object):
+    ''' Solves a nonlinear problem F(w) = 0 on a mixed function space with a nonlinear block Gauss-Seidel iteration.
+        Each block is a group of subspaces of the mixed space with its own function space and Newton solver,
+        and is solved while the other blocks are kept fixed. The iterations are not annotated. Instead, the converged
+        solution is recorded with the annotated solve of the monolithic Newton solver. '''
+
+    def __init__(self, newton_solver, blocks):
+        ''' blocks is a list of (subspaces, function_space, newton_solver) tuples. subspaces are the indices of the
+            subspaces of the mixed space that form the block. function_space is the space of the block and
+            has one subspace for each of them, or is the collapsed subspace if the block consists of a single one. '''
+        if not hasattr(dolfin, "FunctionAssigner"):
+            raise NotImplementedError("The block Gauss-Seidel solver requires DOLFIN 1.4 or newer.")
+        self.newton_solver = newton_solver
+        self.blocks = blocks
+        self.functions = [Function(V, name="Block_state") for (subspaces, V, solver) in blocks]
+        self.parameters = {"maximum_iterations": 50,
+                           "relative_tolerance": 1e-10,
+                           "error_on_nonconvergence": True}
+        # The block forms of the most recent solve
+        self.forms = None
+        # The total number of block Gauss-Seidel iterations performed by this solver
+        self.iterations = 0
+
+    def block_space(self, b, j):
+        subspaces, V, solver = self.blocks[b]
+        return V if len(subspaces) == 1 else V.sub(j)
+
+    def block_function(self, b, j):
+        return self.functions[b] if len(self.blocks[b][0]) == 1 else self.functions[b].sub(j)
+
+    def block_bc(self, bc, b):
+        ''' Returns the boundary condition bc of the mixed space on the space of block b, or None if it does not
+            constrain the block. '''
+        subspaces = self.blocks[b][0]
+        component = list(bc.function_space().component())
+        if component[0] not in subspaces:
+            return None
+        V = self.block_space(b, subspaces.index(component[0]))
+        for c in component[1:]:
+            V = V.sub(c)
+        return DirichletBC(V, bc.value(), *bc.domain_args, method=bc.method())
+
+    def block_forms(self, F, w, bcs, constraints):
+        ''' Splits F into the residuals of the blocks, in which the mixed function is replaced by the block functions. '''
+        if self.forms is not None and self.forms[0] is F and self.forms[1] is w:
+            return self.forms[2]
+
+        W = w.function_space()
+        w_test = ufl.algorithms.extract_arguments(F)[0]
+        test_functions = [TestFunction(V) for (subspaces, V, solver) in self.blocks]
+
+        w_components = []
+        test_components = [[] for b in self.blocks]
+        for i in range(W.num_sub_spaces()):
+            owner = [b for b, (subspaces, V, solver) in enumerate(self.blocks) if i in subspaces][0]
+            j = self.blocks[owner][0].index(i)
+            # The offset of subspace i in the flattened components of the block function
+            offset = sum([value_size(self.block_space(owner, k)) for k in range(j)])
+            for c in range(value_size(W.sub(i))):
+                w_components.append(components(self.functions[owner])[offset + c])
+                for b in range(len(self.blocks)):
+                    test_components[b].append(components(test_functions[b])[offset + c] if b == owner else 0)
+
+        forms = []
+        for b, (subspaces, V, solver) in enumerate(self.blocks):
+            F_b = ufl.replace(F, {w: as_vector(w_components), w_test: as_vector(test_components[b])})
+            bcs_b = [bc_b for bc_b in [self.block_bc(bc, b) for bc in bcs] if bc_b is not None]
+            forms.append((F_b, bcs_b + constraints[b]))
+
+        self.forms = (F, w, forms)
+        return forms
+
+    def assign(self, to_blocks, w):
+        ''' Copies the values of the mixed function into the block functions or vice versa. '''
+        W = w.function_space()
+        for b, (subspaces, V, solver) in enumerate(self.blocks):
+            for j, i in enumerate(subspaces):
+                if to_blocks:
+                    dolfin.FunctionAssigner(self.block_space(b, j), W.sub(i)).assign(self.block_function(b, j), w.sub(i))
+                else:
+                    dolfin.FunctionAssigner(W.sub(i), self.block_space(b, j)).assign(w.sub(i), self.block_function(b, j))
+
+    def solve(self, F, w, bcs=[], constraints=None, annotate=True):
+        ''' Solves F(w) = 0 using w as initial guess. constraints is an optional list with additional
+            constraints (such as DofConstraints) for each block. Returns the number of iterations and the convergence flag. '''
+        params = self.parameters
+        if constraints is None:
+            constraints = [[] for b in self.blocks]
+        forms = self.block_forms(F, w, bcs, constraints)
+
+        self.assign(True, w)
+        x = self.functions[0].vector()
+        x_old = x.copy()
+        converged = False
+        for iteration in range(1, params["maximum_iterations"] + 1):
+            for (F_b, bcs_b), f, (subspaces, V, solver) in zip(forms, self.functions, self.blocks):
+                solver.solve(F_b, f, bcs=bcs_b, annotate=False)
+
+            x_old.axpy(-1.0, x)
+            change = x_old.norm("l2") / max(x.norm("l2"), DOLFIN_EPS)
+            info("Block Gauss-Seidel iteration %d: relative change = %.3e (tol = %.3e)" % (iteration, change, params["relative_tolerance"]))
+            if change < params["relative_tolerance"]:
+                converged = True
+                break
+            x_old.zero()
+            x_old.axpy(1.0, x)
+
+        self.iterations += iteration
+        if converged:
+            info("Block Gauss-Seidel solver finished in %d iterations." % iteration)
+        elif params["error_on_nonconvergence"]:
+            raise RuntimeError("Block Gauss-Seidel solver did not converge after %d iterations." % iteration)
+        else:
+            info_red("Block Gauss-Seidel solver did not converge after %d iterations." % iteration)
+
+        self.assign(False, w)
+        if annotate:
+            self.newton_solver.record(F, w, bcs)
+
+        return iteration, converged
+
+
+class SolverCache:
+    ''' Keeps the solvers of a configuration alive, so that the matrix tensors and symbolic factorisations
+        are reused between timesteps, nonlinear iterations and optimisation iterations. '''
+
+    def __init__(self):
+        self.cache = {}
+
+    def linear_solver(self, name, function_space, linear_solver, preconditioner):
+        ''' Returns the cached linear solver with the given name. A new solver is created if the function space
+            or the solver settings have changed. '''
+        key = (name, linear_solver, preconditioner)
+        if key not in self.cache or self.cache[key][0] is not function_space:
+            self.cache[key] = (function_space, ReusableLinearSolver(linear_solver, preconditioner, function_space))
+        return self.cache[key][1]
+
+    def newton_solver(self, name, function_space, linear_solver, preconditioner):
+        ''' Returns the cached Newton solver with the given name. '''
+        key = (name, "newton")
+        solver = self.linear_solver(name, function_space, linear_solver, preconditioner)
+        if key not in self.cache or self.cache[key][1].linear_solver is not solver:
+            self.cache[key] = (function_space, ReusableNewtonSolver(solver))
+        return self.cache[key][1]
+
+    def block_gauss_seidel_solver(self, name, function_space, blocks, linear_solver, preconditioner):
+        ''' Returns the cached block Gauss-Seidel solver with the given name. blocks is a list of
+            (subspaces, function_space, preconditioner) tuples, for each of which a Newton solver is created. '''
+        key = (name, "block_gauss_seidel")
+        newton_solver = self.newton_solver(name, function_space, linear_solver, preconditioner)
+        block_solvers = [(subspaces, V, self.newton_solver("%s_block_%i" % (name, b), V, linear_solver, block_preconditioner))
+                         for b, (subspaces, V, block_preconditioner) in enumerate(blocks)]
+        if key not in self.cache or self.cache[key][1].newton_solver is not newton_solver or \
+           [solver for (subspaces, V, solver) in self.cache[key][1].blocks] != [solver for (subspaces, V, solver) in block_solvers]:
+            self.cache[key] = (function_space, BlockGaussSeidelSolver(newton_solver, block_solvers))
+        return self.cache[key][1]
+
+    def newton_iterations(self):
+        ''' Returns the total number of Newton iterations performed by the cached Newton solvers. '''
+        return sum([solver.iterations for (function_space, solver) in self.cache.itervalues() if isinstance(solver, ReusableNewtonSolver)])
+
+    def report(self):
+        ''' Prints the time that was saved by reusing the symbolic factorisations. '''
+        for key, (function_space, solver) in self.cache.iteritems():
+            if isinstance(solver, ReusableLinearSolver) and len(solver.reuse_timings) > 0:
+                info_blue("Solver '%s': %i solves reused the symbolic analysis, saving approximately %.2f s." % (key[0], len(solver.reuse_timings), solver.saved_analysis_time()))
@@ -0,0 +1,125 @@
+import hashlib
+import dolfin
+from dolfin import *
+from dolfin_adjoint import *
+from helpers import info_blue, print0
+from dirichlet_bc import DirichletBCSet
+import shallow_water_model as sw_model
+
+# The parameters that determine the spun-up state. The turbines are not included, since the spin-up is
+# computed without turbines and is reused for all turbine layouts.
+fingerprint_keys = ["g", "depth", "friction", "quadratic_friction", "diffusion_coef", "include_advection",
+                    "include_diffusion", "include_time_term", "steady_state", "free_slip_on_sides", "bctype",
+                    "strong_bc", "flather_bc_expr", "weak_dirichlet_bc_expr", "initial_condition", "theta", "dt",
+                    "turbine_thrust_parametrisation", "implicit_turbine_thrust_parametrisation"]
+
+
+def fingerprint_value(value):
+    ''' Returns a string that identifies the parameter value. Constants are identified by their values, expressions
+        by their C++ code and their parameters except the time, and strong boundary condition sets by their
+        expressions. Other dolfin objects are identified by their type. '''
+    if isinstance(value, dolfin.Constant):
+        return repr(tuple(value.values()))
+    if isinstance(value, (bool, int, long, float, str, type(None))):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return repr([fingerprint_value(v) for v in value])
+    if isinstance(value, dolfin.Expression):
+        # The time parameter is set by the time loop and differs between the spin-up and the restarted run
+        user_parameters = sorted([key for key in getattr(value, "user_parameters", {}) if key != "t"])
+        return repr((type(value).__name__, getattr(value, "cppcode", None), [(key, getattr(value, key)) for key in user_parameters]))
+    if isinstance(value, DirichletBCSet):
+        return repr((len(value.bcs), fingerprint_value(value.expressions), fingerprint_value(value.constant_inflow_values)))
+    return type(value).__name__
+
+
+def fingerprint_mesh(mesh):
+    ''' Returns a hash of the vertex coordinates and the cells of the local part of the mesh. '''
+    md5 = hashlib.md5()
+    md5.update(mesh.coordinates().tostring())
+    md5.update(mesh.cells().tostring())
+    return md5.hexdigest()
+
+
+def fingerprint(config):
+    ''' Returns the fingerprint of the configuration: a hash of the mesh, the finite element and the parameters that
+        determine the spun-up state. '''
+    params = config.params
+    items = [("mesh", fingerprint_mesh(config.function_space.mesh())), ("element", str(config.function_space.ufl_element())),
+             ("dim", str(config.function_space.dim()))]
+    items += [(key, fingerprint_value(params[key])) for key in fingerprint_keys]
+    return hashlib.md5(repr(items)).hexdigest()
+
+
+def check_hdf5():
+    if not hasattr(dolfin, "HDF5File") or not hasattr(dolfin.HDF5File, "attributes"):
+        raise NotImplementedError("The spin-up states require DOLFIN 1.4 or newer with HDF5 support.")
+
+
+def save_spin_up_state(config, state, filename):
+    ''' Saves state, the current time and the fingerprint of the configuration to the HDF5 file filename. '''
+    check_hdf5()
+    hdf5 = HDF5File(state.function_space().mesh().mpi_comm(), filename, "w")
+    hdf5.write(state, "/state")
+    attributes = hdf5.attributes("/state")
+    attributes["fingerprint"] = fingerprint(config)
+    attributes["time"] = float(config.params["current_time"])
+    hdf5.close()
+    print0("Saved the spin-up state at time %s to %s." % (config.params["current_time"], filename))
+
+
+def load_spin_up_state(config, state, filename):
+    ''' Loads the spin-up state from the HDF5 file filename into state and returns its time.
+        Raises a ValueError if the file was saved with a different configuration. '''
+    check_hdf5()
+    hdf5 = HDF5File(state.function_space().mesh().mpi_comm(), filename, "r")
+    attributes = hdf5.attributes("/state")
+    if attributes["fingerprint"] != fingerprint(config):
+        hdf5.close()
+        raise ValueError("The spin-up state in %s was saved with a different configuration." % filename)
+    time = attributes["time"]
+    hdf5.read(state, "/state")
+    hdf5.close()
+    return time
+
+
+def initial_state(config, state):
+    ''' Sets state to the initial condition of a forward run. This is the spin-up state of params["spin_up_file"]
+        if it is set, and params["initial_condition"] otherwise. The spin-up state must have been saved at
+        params["start_time"]. '''
+    params = config.params
+    if params["spin_up_file"] is None:
+        state.assign(params['initial_condition'], annotate=False)
+        return
+
+    time = load_spin_up_state(config, state, params["spin_up_file"])
+    if abs(time - params["start_time"]) > 1e-10 * max(1., abs(time)):
+        raise ValueError("The spin-up state in %s was saved at time %s, but the start_time is %s." % (params["spin_up_file"], time, params["start_time"]))
+    info_blue("Starting from the spin-up state in %s." % params["spin_up_file"])
+
+
+def spin_up(config, filename, spin_up_time, forward_model=sw_model.sw_solve):
+    ''' Solves the problem without turbines from params["start_time"] to spin_up_time without annotation, and
+        saves the final state to the HDF5 file filename. Later forward runs can start from that state by setting
+        params["spin_up_file"] to filename and params["start_time"] to spin_up_time. Returns the spun-up state. '''
+    params = config.params
+    if params["steady_state"] or not params["include_time_term"]:
+        raise ValueError("The spin-up requires an unsteady problem.")
+    if params["turbine_thrust_parametrisation"] or params["implicit_turbine_thrust_parametrisation"]:
+        raise NotImplementedError("The spin-up does not support the thrust turbine parametrisations.")
+
+    state = Function(config.function_space, name="Spin_up_state")
+    initial_state(config, state)
+
+    saved = dict((key, params[key]) for key in ["finish_time", "dump_period", "observers", "cache_forward_state"])
+    params["finish_time"] = spin_up_time
+    params["dump_period"] = 0
+    params["observers"] = []
+    params["cache_forward_state"] = False
+    try:
+        forward_model(config, state, annotate=False)
+    finally:
+        params.update(saved)
+
+    save_spin_up_state(config, state, filename)
+    return state
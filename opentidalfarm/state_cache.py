@@ -0,0 +1,143 @@
+import os
+import shutil
+import tempfile
+import zlib
+import numpy
+from collections import OrderedDict
+from helpers import info_blue
+
+
+class StateCache:
+    ''' A bounded cache of forward states that are used as initial guesses in the next optimisation iteration.
+        The states are stored as the local part of their vectors and are keyed by the integer timestep.
+        If a new state does not fit into the memory budget, it is not cached. The time loop accesses the states in
+        timestep order, in which evicting the least recently used state would always drop the state that is needed
+        next. Instead, the cache keeps the states of the first timesteps. '''
+
+    storages = ["memory", "compressed", "mmap"]
+    precisions = {"double": numpy.float64, "single": numpy.float32}
+
+    def __init__(self):
+        self.cache = OrderedDict()
+        self.budget = None
+        self.precision = None
+        self.storage = None
+        self.size = None
+        self.mmap_dir = None
+        # The number of bytes used by the cached states, and the size of the smallest compressed state
+        self.total_nbytes = 0
+        self.min_compressed_nbytes = 0
+        # The number of successful and failed loads
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, config):
+        ''' Applies the cache settings of the configuration. The cache is cleared if the settings have changed. '''
+        params = config.params
+        if params["cache_forward_state_storage"] not in self.storages:
+            raise ValueError("Unknown cache_forward_state_storage: %s. Valid values are: %s." % (params["cache_forward_state_storage"], ", ".join(self.storages)))
+        if params["cache_forward_state_precision"] not in self.precisions:
+            raise ValueError("Unknown cache_forward_state_precision: %s. Valid values are: %s." % (params["cache_forward_state_precision"], ", ".join(self.precisions.keys())))
+
+        settings = (params["cache_forward_state_storage"], params["cache_forward_state_precision"])
+        if settings != (self.storage, self.precision):
+            self.clear()
+            self.storage, self.precision = settings
+        self.budget = params["cache_forward_state_budget"] * 1024 ** 2
+
+        # Drop the states of the last timesteps until the cache fits into a reduced budget
+        while self.nbytes() > self.budget:
+            self.remove(max(self.cache.keys()))
+
+    def clear(self):
+        ''' Removes all cached states. '''
+        self.cache = OrderedDict()
+        self.size = None
+        self.total_nbytes = 0
+        self.min_compressed_nbytes = 0
+        if self.mmap_dir is not None:
+            shutil.rmtree(self.mmap_dir, ignore_errors=True)
+            self.mmap_dir = None
+
+    def nbytes(self):
+        ''' Returns the number of bytes used by the cached states. '''
+        return self.total_nbytes
+
+    def has_key(self, timestep):
+        return timestep in self.cache
+
+    def store(self, timestep, state):
+        ''' Stores the state for the given timestep. '''
+        self.store_array(timestep, state.vector().array())
+
+    def store_array(self, timestep, x):
+        ''' Stores the local part of a state vector for the given timestep. '''
+        if self.size is not None and self.size != len(x):
+            # The function space has changed
+            self.clear()
+        self.size = len(x)
+
+        x = x.astype(self.precisions[self.precision])
+        self.remove(timestep)
+
+        # Reject the state before it is encoded if it can not fit. The size of a compressed state is only known
+        # after the compression, and is estimated with the smallest compressed state so far.
+        if self.storage == "compressed":
+            estimated_nbytes = self.min_compressed_nbytes
+        else:
+            estimated_nbytes = x.nbytes
+        if self.total_nbytes + estimated_nbytes > self.budget:
+            info_blue("State cache budget exceeded. The state of timestep %i is not cached." % timestep)
+            return
+
+        if self.storage == "memory":
+            data = x
+            nbytes = x.nbytes
+        elif self.storage == "compressed":
+            data = zlib.compress(x.tostring(), 1)
+            nbytes = len(data)
+            if self.total_nbytes + nbytes > self.budget:
+                info_blue("State cache budget exceeded. The state of timestep %i is not cached." % timestep)
+                return
+            if self.min_compressed_nbytes == 0 or nbytes < self.min_compressed_nbytes:
+                self.min_compressed_nbytes = nbytes
+        else:
+            if self.mmap_dir is None:
+                self.mmap_dir = tempfile.mkdtemp(prefix="opentidalfarm_state_cache_")
+            data = numpy.memmap(os.path.join(self.mmap_dir, "state_%i.dat" % timestep), dtype=x.dtype, mode="w+", shape=x.shape)
+            data[:] = x
+            data.flush()
+            nbytes = x.nbytes
+
+        self.cache[timestep] = (data, nbytes)
+        self.total_nbytes += nbytes
+
+    def load(self, timestep, state):
+        ''' Loads the cached state of the given timestep into state. Returns False if the timestep is not cached. '''
+        if timestep not in self.cache:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        data, nbytes = self.cache[timestep]
+
+        if self.storage == "compressed":
+            x = numpy.fromstring(zlib.decompress(data), dtype=self.precisions[self.precision])
+        else:
+            x = numpy.array(data)
+        if len(x) != state.vector().local_size():
+            raise ValueError("The cached state of timestep %i has %i entries, but the state has %i. The function space has changed since the state was cached." % (timestep, len(x), state.vector().local_size()))
+        state.vector().set_local(x.astype(numpy.float64))
+        state.vector().apply("insert")
+        return True
+
+    def remove(self, timestep):
+        ''' Removes the state of the given timestep from the cache. '''
+        if timestep not in self.cache:
+            return
+        data, nbytes = self.cache.pop(timestep)
+        self.total_nbytes -= nbytes
+        if self.storage == "mmap":
+            filename = data.filename
+            del data
+            os.remove(filename)
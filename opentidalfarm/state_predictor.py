@@ -0,0 +1,59 @@
+import numpy
+from helpers import info_blue
+
+
+class StatePredictor(object):
+    ''' Extrapolates the initial guess of a nonlinear solve from the (control, state) pairs of the most recent solves.
+        The controls are represented by their turbine friction fields. The new control is approximated as a
+        least squares combination of the previous controls and the same combination is applied to the states.
+        With two pairs this is the secant prediction along the last step of the optimisation algorithm. '''
+
+    def __init__(self, depth, max_extrapolation=2.0):
+        self.depth = depth
+        # Predictions that extrapolate further than max_extrapolation times the last step are rejected
+        self.max_extrapolation = max_extrapolation
+        self.controls = []
+        self.states = []
+
+    def add(self, control, state):
+        ''' Adds the control and the corresponding solution to the history. '''
+        if len(self.states) > 0 and self.states[-1].size() != state.vector().size():
+            self.controls = []
+            self.states = []
+        self.controls.append(control.vector().copy())
+        self.states.append(state.vector().copy())
+        if len(self.states) > self.depth:
+            self.controls.pop(0)
+            self.states.pop(0)
+
+    def predict(self, control, state):
+        ''' Sets state to the predicted solution for the given control. Without history this is the most recent state. '''
+        x = state.vector()
+        x.zero()
+        x.axpy(1.0, self.states[-1])
+
+        m = len(self.controls) - 1
+        if m == 0:
+            return
+
+        dm = control.vector().copy()
+        dm.axpy(-1.0, self.controls[-1])
+        dM = []
+        for c in self.controls[:-1]:
+            d = c.copy()
+            d.axpy(-1.0, self.controls[-1])
+            dM.append(d)
+
+        # Solve the small least squares problem min ||dm - dM coeffs|| using parallel safe inner products
+        A = numpy.array([[dM[i].inner(dM[k]) for k in range(m)] for i in range(m)])
+        b = numpy.array([dM[i].inner(dm) for i in range(m)])
+        coeffs = numpy.linalg.lstsq(A, b)[0]
+
+        if numpy.any(numpy.abs(coeffs) > self.max_extrapolation) or not numpy.all(numpy.isfinite(coeffs)):
+            info_blue("Rejecting the extrapolated initial guess and using the most recent state instead.")
+            return
+
+        info_blue("Extrapolating the initial guess from the last %i solutions with coefficients %s." % (m + 1, str(coeffs)))
+        for c, s in zip(coeffs, self.states[:-1]):
+            x.axpy(c, s)
+            x.axpy(-c, self.states[-1])
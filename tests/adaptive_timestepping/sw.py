@@ -0,0 +1,44 @@
+''' Tests the gradient of the power functional with adaptive timestepping. '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+config = DefaultConfiguration(nx=15, ny=15)
+config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+config.params["newton_solver"] = True
+config.params["quadratic_friction"] = True
+config.params["friction"] = Constant(0.0025)
+config.params["theta"] = 0.5
+config.params["dump_period"] = 0
+config.params["adaptive_timestepping"] = True
+config.params["adaptive_timestepping_tolerance"] = 1e-3
+config.params["dt_max"] = 8 * config.params["dt"]
+config.params["finish_time"] = config.params["start_time"] + 10 * config.params["dt"]
+
+config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                 eta0=2.,
+                                 g=config.params["g"],
+                                 depth=config.params["depth"],
+                                 t=config.params["current_time"],
+                                 k=pi / 3000)
+
+turbine_pos = []
+border_x = config.domain.basin_x / 10
+border_y = config.domain.basin_y / 10
+for x_r in numpy.linspace(0. + border_x, config.domain.basin_x - border_x, 2):
+    for y_r in numpy.linspace(0. + border_y, config.domain.basin_y - border_y, 2):
+        turbine_pos.append((float(x_r), float(y_r)))
+config.set_turbine_pos(turbine_pos, friction=1.0)
+
+model = ReducedFunctional(config, scale=10**-6)
+m0 = model.initial_control()
+
+p = numpy.random.rand(len(m0))
+minconv = helpers.test_gradient_array(model.j, model.dj, m0, seed=0.1, perturbation_direction=p)
+if minconv < 1.9:
+    info_red("The gradient taylor remainder test failed with adaptive timestepping.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
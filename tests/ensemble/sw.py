@@ -0,0 +1,68 @@
+''' Test description:
+ - steady state flood and ebb scenarios that share the turbine layout
+ - the ensemble reduced functional evaluates both scenarios in worker processes
+ - its functional value and gradient must equal the weighted sum of the scenario reduced functionals
+ - the gradient must pass the Taylor remainder test
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+
+set_log_level(ERROR)
+parameters["std_out_all_processes"] = False
+
+
+def default_config(inflow_label, outflow_label, direction):
+    config = configuration.DefaultConfiguration(nx=20, ny=10)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(640, 320, 20, 10))
+    config.params["steady_state"] = True
+    config.params["include_advection"] = True
+    config.params["include_diffusion"] = True
+    config.params["diffusion_coef"] = 5.0
+    config.params["quadratic_friction"] = True
+    config.params["newton_solver"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 1.0
+    config.params["functional_final_time_only"] = True
+    config.params["dump_period"] = 0
+
+    bc = DirichletBCSet(config)
+    bc.add_constant_flow(inflow_label, 2.0, direction=direction)
+    bc.add_zero_eta(outflow_label)
+    config.params["bctype"] = "strong_dirichlet"
+    config.params["strong_bc"] = bc
+    config.params["free_slip_on_sides"] = True
+
+    config.set_site_dimensions(160, 480, 80, 240)
+    deploy_turbines(config, nx=3, ny=2)
+    config.params["controls"] = ["turbine_pos"]
+    return config
+
+weights = [0.6, 0.4]
+flood = default_config(1, 2, [1, 0])
+ebb = default_config(2, 1, [-1, 0])
+
+rf = EnsembleReducedFunctional([flood, ebb], weights=weights, processes=2)
+m0 = rf.initial_control()
+j = rf.j(m0)
+dj = rf.dj(m0, forget=True)
+
+j_ref = 0.
+dj_ref = 0.
+for w, config in zip(weights, [default_config(1, 2, [1, 0]), default_config(2, 1, [-1, 0])]):
+    rf_scenario = ReducedFunctional(config)
+    j_ref += w * rf_scenario.j(m0)
+    dj_ref += w * rf_scenario.dj(m0, forget=True)
+
+if abs(j - j_ref) > 1e-8 * abs(j_ref) or numpy.linalg.norm(dj - dj_ref) > 1e-8 * numpy.linalg.norm(dj_ref):
+    info_red("The ensemble functional does not equal the weighted sum of the scenario functionals.")
+    sys.exit(1)
+
+p = numpy.random.rand(len(m0))
+minconv = helpers.test_gradient_array(rf.j, rf.dj, m0, seed=0.1, perturbation_direction=p)
+if minconv < 1.9:
+    info_red("The ensemble gradient taylor remainder test failed.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
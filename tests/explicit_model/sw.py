@@ -0,0 +1,42 @@
+''' Tests the gradient of the power functional computed with the explicit SSPRK model. '''
+
+import sys
+from opentidalfarm import *
+from opentidalfarm.explicit_model import ssprk_solve
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+config = DefaultConfiguration(nx=15, ny=15, finite_element=finite_elements.p1dgp1)
+config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+config.params["quadratic_friction"] = True
+config.params["include_advection"] = True
+config.params["friction"] = Constant(0.0025)
+config.params["dump_period"] = 0
+config.params["explicit_cfl"] = 0.2
+config.params["finish_time"] = config.params["start_time"] + 20.
+
+config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                 eta0=2.,
+                                 g=config.params["g"],
+                                 depth=config.params["depth"],
+                                 t=config.params["current_time"],
+                                 k=pi / 3000)
+
+turbine_pos = []
+border_x = config.domain.basin_x / 10
+border_y = config.domain.basin_y / 10
+for x_r in numpy.linspace(0. + border_x, config.domain.basin_x - border_x, 2):
+    for y_r in numpy.linspace(0. + border_y, config.domain.basin_y - border_y, 2):
+        turbine_pos.append((float(x_r), float(y_r)))
+config.set_turbine_pos(turbine_pos, friction=1.0)
+
+model = ReducedFunctional(config, scale=10**-6, forward_model=ssprk_solve)
+m0 = model.initial_control()
+
+p = numpy.random.rand(len(m0))
+minconv = helpers.test_gradient_array(model.j, model.dj, m0, seed=0.1, perturbation_direction=p)
+if minconv < 1.9:
+    info_red("The gradient taylor remainder test failed for the explicit model.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,52 @@
+''' Test description:
+ - nonlinear shallow water equations with advection and quadratic friction on a P2-P1 discretisation
+ - the system is solved once with the default direct solver and once with gmres and the fieldsplit preconditioner
+ - both solutions must agree
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+from dolfin_adjoint import adj_reset
+
+set_log_level(ERROR)
+parameters["std_out_all_processes"] = False
+
+
+def solve_with(linear_solver, preconditioner):
+    config = configuration.DefaultConfiguration(nx=20, ny=10)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 20, 10))
+    eta0 = 2.0
+    k = pi / config.domain.basin_x
+    config.params["finish_time"] = 2 * config.params["dt"]
+    config.params["dump_period"] = 0
+    config.params["include_advection"] = True
+    config.params["quadratic_friction"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["newton_solver"] = True
+    config.params["linear_solver"] = linear_solver
+    config.params["preconditioner"] = preconditioner
+    config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                                  eta0=eta0,
+                                                  g=config.params["g"],
+                                                  depth=config.params["depth"],
+                                                  t=config.params["current_time"],
+                                                  k=k)
+
+    state = Function(config.function_space)
+    state.interpolate(SinusoidalInitialCondition(config, eta0, k, config.params["depth"]))
+    adj_reset()
+    shallow_water_model.sw_solve(config, state, annotate=False)
+    return state
+
+state_direct = solve_with("default", "default")
+state_fieldsplit = solve_with("gmres", "fieldsplit")
+
+e = state_direct - state_fieldsplit
+rel_error = sqrt(assemble(dot(e, e) * dx)) / sqrt(assemble(dot(state_direct, state_direct) * dx))
+info_green("Relative difference between the direct and fieldsplit solutions: %e" % rel_error)
+if rel_error > 1e-6:
+    info_red("The fieldsplit preconditioned solve does not agree with the direct solve.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,55 @@
+''' Test description:
+ - an unsteady forward run writes a checkpoint every 4 timesteps of its 10 timesteps
+ - a second run resumes from the last checkpoint (timestep 8)
+ - the resumed run must give bit-identical functional values and final states
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+
+def default_config():
+    config = DefaultConfiguration(nx=15, ny=15)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+    config.params["newton_solver"] = True
+    config.params["quadratic_friction"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 0.5
+    config.params["dump_period"] = 0
+    config.params["finish_time"] = config.params["start_time"] + 10 * config.params["dt"]
+    config.params["forward_checkpoint_period"] = 4
+    config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                     eta0=2.,
+                                     g=config.params["g"],
+                                     depth=config.params["depth"],
+                                     t=config.params["current_time"],
+                                     k=pi / 3000)
+
+    turbine_pos = []
+    border_x = config.domain.basin_x / 10
+    border_y = config.domain.basin_y / 10
+    for x_r in numpy.linspace(0. + border_x, config.domain.basin_x - border_x, 2):
+        for y_r in numpy.linspace(0. + border_y, config.domain.basin_y - border_y, 2):
+            turbine_pos.append((float(x_r), float(y_r)))
+    config.set_turbine_pos(turbine_pos, friction=1.0)
+    return config
+
+config = default_config()
+rf = ReducedFunctional(config)
+m0 = rf.initial_control()
+j = rf.j(m0, annotate=False)
+x = rf.last_state.vector().array()
+
+config = default_config()
+config.params["resume_from_forward_checkpoint"] = True
+rf_resumed = ReducedFunctional(config)
+j_resumed = rf_resumed.j(m0, annotate=False)
+x_resumed = rf_resumed.last_state.vector().array()
+
+if j != j_resumed or numpy.any(x != x_resumed):
+    info_red("The resumed run is not bit-identical to the uninterrupted run (functional values %r and %r)." % (j, j_resumed))
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,62 @@
+''' Test description:
+ - steady state solve with the individual turbine power output
+ - the vectorised power and force of each turbine must match the assembly of the individual turbine forms
+ - the individual turbine powers must add up to the total power
+ '''
+
+import sys
+from opentidalfarm import *
+from opentidalfarm.functionals import IndividualTurbineContributions
+import opentidalfarm.domains
+
+set_log_level(ERROR)
+parameters["std_out_all_processes"] = False
+
+config = configuration.DefaultConfiguration(nx=40, ny=20)
+config.set_domain(opentidalfarm.domains.RectangularDomain(640, 320, 40, 20))
+config.params["steady_state"] = True
+config.params["include_advection"] = True
+config.params["include_diffusion"] = True
+config.params["diffusion_coef"] = 2.0
+config.params["quadratic_friction"] = True
+config.params["newton_solver"] = True
+config.params["friction"] = Constant(0.0025)
+config.params["theta"] = 1.0
+config.params["functional_final_time_only"] = True
+config.params["print_individual_turbine_power"] = True
+
+bc = DirichletBCSet(config)
+bc.add_constant_flow(1, 2.0)
+bc.add_zero_eta(2)
+config.params["bctype"] = "strong_dirichlet"
+config.params["strong_bc"] = bc
+config.params["free_slip_on_sides"] = True
+
+config.set_site_dimensions(160, 480, 80, 240)
+deploy_turbines(config, nx=4, ny=2)
+config.params["controls"] = ["turbine_pos"]
+
+rf = ReducedFunctional(config)
+m0 = rf.initial_control()
+j, state = rf.compute_functional_mem(m0, return_final_state=True)
+
+functional = config.functional(config)
+contributions = IndividualTurbineContributions(functional, state)
+power = contributions.power()
+force = contributions.force()
+
+errors = []
+for i in range(len(config.params["turbine_pos"])):
+    power_i = assemble(functional.Jt_individual(state, i))
+    force_i = assemble(functional.force_individual(state, i))
+    errors.append(abs(power[i] - power_i) / abs(power_i))
+    errors.append(abs(force[i] - force_i) / abs(force_i))
+
+if max(errors) > 1e-10:
+    info_red("The vectorised turbine contributions differ from the individual assemblies (relative error %e)." % max(errors))
+    sys.exit(1)
+elif abs(sum(power) - j) / abs(j) > 1e-10:
+    info_red("The individual turbine powers do not add up to the total power.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,61 @@
+''' Test description:
+ - cold-started steady state solve with advection and quadratic friction
+ - the problem is solved once directly and once with a mesh sequence of two coarser meshes
+ - both solves must give the same functional value
+ - the number of Newton iterations on the fine mesh is reported
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+
+set_log_level(ERROR)
+parameters["std_out_all_processes"] = False
+
+
+def default_config(nx, ny):
+    config = configuration.DefaultConfiguration(nx=nx, ny=ny)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(640, 320, nx, ny))
+    config.params["steady_state"] = True
+    config.params["include_advection"] = True
+    config.params["include_diffusion"] = True
+    config.params["diffusion_coef"] = 2.0
+    config.params["quadratic_friction"] = True
+    config.params["newton_solver"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 1.0
+    config.params["functional_final_time_only"] = True
+    config.params["dump_period"] = 0
+
+    bc = DirichletBCSet(config)
+    bc.add_constant_flow(1, 2.0)
+    bc.add_zero_eta(2)
+    config.params["bctype"] = "strong_dirichlet"
+    config.params["strong_bc"] = bc
+    config.params["free_slip_on_sides"] = True
+
+    config.set_site_dimensions(160, 480, 80, 240)
+    deploy_turbines(config, nx=4, ny=2)
+    config.params["controls"] = ["turbine_pos"]
+    return config
+
+functional_values = []
+newton_iterations = []
+for mesh_sequence in [[], [default_config(10, 5), default_config(20, 10)]]:
+    config = default_config(40, 20)
+    config.params["mesh_sequence"] = mesh_sequence
+    rf = ReducedFunctional(config)
+    m0 = rf.initial_control()
+    functional_values.append(rf.j(m0, annotate=False))
+    newton_iterations.append(config.solver_cache.newton_iterations())
+
+info_green("Newton iterations on the fine mesh without mesh sequencing: %i, with mesh sequencing: %i." % (newton_iterations[0], newton_iterations[1]))
+rel_diff = abs(functional_values[0] - functional_values[1]) / abs(functional_values[0])
+if rel_diff > 1e-8:
+    info_red("The mesh sequencing changed the functional value (relative difference %e)." % rel_diff)
+    sys.exit(1)
+elif newton_iterations[1] > newton_iterations[0]:
+    info_red("The mesh sequencing increased the number of Newton iterations on the fine mesh.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
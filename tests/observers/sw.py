@@ -0,0 +1,56 @@
+''' Test description:
+ - runs an unsteady forward model with a synchronous and an asynchronous observer
+ - the observers must be called at their sampling periods only
+ - the asynchronous observer must receive copies of the states
+ '''
+
+import sys
+from opentidalfarm import *
+from opentidalfarm.initial_conditions import SinusoidalInitialCondition
+import opentidalfarm.domains
+
+set_log_level(ERROR)
+parameters["std_out_all_processes"] = False
+
+config = DefaultConfiguration(nx=10, ny=2)
+config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 10, 2))
+eta0 = 2.0
+k = pi / config.domain.basin_x
+config.params["finish_time"] = pi / (sqrt(config.params["g"] * config.params["depth"]) * k) / 10
+config.params["dt"] = config.params["finish_time"] / 10
+config.params["dump_period"] = 0
+config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                              eta0=eta0,
+                                              g=config.params["g"],
+                                              depth=config.params["depth"],
+                                              t=config.params["current_time"],
+                                              k=k)
+
+sync_times = []
+async_norms = []
+
+
+def sync_callback(t, state, turbine_field):
+    sync_times.append(t)
+
+
+def async_callback(t, state, turbine_field):
+    # Only use process local data, as asynchronous observers must not communicate
+    async_norms.append(abs(state.vector().array()).max())
+
+config.params["observers"] = [Observer(sync_callback, sampling_period=2),
+                              Observer(async_callback, sampling_period=3, asynchronous=True)]
+
+state = Function(config.function_space)
+state.interpolate(SinusoidalInitialCondition(config, eta0, k, config.params["depth"]))
+shallow_water_model.sw_solve(config, state, annotate=False)
+
+timesteps = int(round(config.params["finish_time"] / config.params["dt"]))
+if len(sync_times) != timesteps / 2 or len(async_norms) != timesteps / 3:
+    info_red("The observers were called %i and %i times, expected %i and %i times." % (len(sync_times), len(async_norms), timesteps / 2, timesteps / 3))
+    sys.exit(1)
+elif len(set(async_norms)) != len(async_norms):
+    info_red("The asynchronous observer did not receive copies of the states.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,43 @@
+''' Compares the functional computed with the parareal solver with the sequential forward solve. '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+config = DefaultConfiguration(nx=15, ny=15)
+config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+config.params["dump_period"] = 0
+config.params["finish_time"] = config.params["start_time"] + 16 * config.params["dt"]
+config.params["parareal_slices"] = 4
+config.params["parareal_coarse_dt"] = 2 * config.params["dt"]
+config.params["parareal_processes"] = 2
+config.params["parareal_tolerance"] = 0.
+
+config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                 eta0=2.,
+                                 g=config.params["g"],
+                                 depth=config.params["depth"],
+                                 t=config.params["current_time"],
+                                 k=pi / 3000)
+
+config.set_turbine_pos([(1000., 500.), (2000., 500.)], friction=1.0)
+config.turbine_cache.update(config)
+tf = config.turbine_cache.cache["turbine_field"]
+
+state = Function(config.function_space)
+state.assign(config.params["initial_condition"], annotate=False)
+j_sequential = shallow_water_model.sw_solve(config, state, turbine_field=tf, functional=config.functional(config), annotate=False)
+
+state_parareal = Function(config.function_space)
+state_parareal.assign(config.params["initial_condition"], annotate=False)
+parareal = Parareal(config)
+j_parareal = parareal(config, state_parareal, turbine_field=tf, functional=config.functional(config))
+
+# Without a tolerance, the parareal solver runs until it reproduces the sequential solution
+error = abs(j_parareal - j_sequential) / abs(j_sequential)
+if error > 1e-10:
+    info_red("The parareal functional differs from the sequential functional by a relative error of %g." % error)
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,72 @@
+''' Test description:
+ - the POD surrogate is trained through ReducedFunctional.__call__ and derivative, as in the optimisation loop of maximize
+ - each optimisation iteration must run a single full forward solve, which the gradient reuses
+ - the surrogate must be trained after the iterations at pod_training_runs distinct layouts
+ - once trained, the functional evaluations must not run the full forward model
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+
+def default_config():
+    config = DefaultConfiguration(nx=15, ny=15)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+    config.params["newton_solver"] = True
+    config.params["quadratic_friction"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 0.5
+    config.params["dump_period"] = 0
+    config.params["finish_time"] = config.params["start_time"] + 10 * config.params["dt"]
+    config.params["pod_training_runs"] = 2
+    config.params["controls"] = ["turbine_friction"]
+    config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                     eta0=2.,
+                                     g=config.params["g"],
+                                     depth=config.params["depth"],
+                                     t=config.params["current_time"],
+                                     k=pi / 3000)
+
+    turbine_pos = []
+    border_x = config.domain.basin_x / 10
+    border_y = config.domain.basin_y / 10
+    for x_r in numpy.linspace(0. + border_x, config.domain.basin_x - border_x, 2):
+        for y_r in numpy.linspace(0. + border_y, config.domain.basin_y - border_y, 2):
+            turbine_pos.append((float(x_r), float(y_r)))
+    config.set_turbine_pos(turbine_pos, friction=1.0)
+    return config
+
+config = default_config()
+surrogate = PODSurrogate(config)
+
+# Count the full forward solves
+full_solves = []
+def counting_sw_solve(*args, **kwargs):
+    full_solves.append(1)
+    return shallow_water_model.sw_solve(*args, **kwargs)
+surrogate.forward_model = counting_sw_solve
+
+rf = ReducedFunctional(config, scale=10**-6, forward_model=surrogate)
+m0 = rf.initial_control()
+
+# The optimisation iterations at two layouts
+for i, m in enumerate([0.5 * m0, 1.5 * m0]):
+    rf(m)
+    rf.derivative(m, forget=True)
+    if len(full_solves) != i + 1 or surrogate.training_runs != i + 1:
+        info_red("Optimisation iteration %i ran %i full forward solves and counted %i training runs." % (i + 1, len(full_solves), surrogate.training_runs))
+        sys.exit(1)
+
+if not surrogate.trained:
+    info_red("The POD surrogate was not trained after the optimisation iterations at two layouts.")
+    sys.exit(1)
+
+# A line search evaluation uses the reduced model
+rf(m0)
+if len(full_solves) != 2:
+    info_red("The trained POD surrogate ran the full forward model for a functional evaluation.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
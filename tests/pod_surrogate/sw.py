@@ -0,0 +1,69 @@
+''' Test description:
+ - the POD surrogate is trained with the full forward runs of two turbine layouts
+ - the functional of a third layout computed with the reduced model must be close to that of the full model
+ - the gradient at that layout must be computed with the full model and pass the Taylor remainder test
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+
+def default_config():
+    config = DefaultConfiguration(nx=15, ny=15)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+    config.params["newton_solver"] = True
+    config.params["quadratic_friction"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 0.5
+    config.params["dump_period"] = 0
+    config.params["finish_time"] = config.params["start_time"] + 10 * config.params["dt"]
+    config.params["pod_training_runs"] = 2
+    config.params["controls"] = ["turbine_friction"]
+    config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                     eta0=2.,
+                                     g=config.params["g"],
+                                     depth=config.params["depth"],
+                                     t=config.params["current_time"],
+                                     k=pi / 3000)
+
+    turbine_pos = []
+    border_x = config.domain.basin_x / 10
+    border_y = config.domain.basin_y / 10
+    for x_r in numpy.linspace(0. + border_x, config.domain.basin_x - border_x, 2):
+        for y_r in numpy.linspace(0. + border_y, config.domain.basin_y - border_y, 2):
+            turbine_pos.append((float(x_r), float(y_r)))
+    config.set_turbine_pos(turbine_pos, friction=1.0)
+    return config
+
+config = default_config()
+surrogate = PODSurrogate(config)
+rf = ReducedFunctional(config, scale=10**-6, forward_model=surrogate)
+m0 = rf.initial_control()
+
+# Training with the full model
+rf.j(0.5 * m0)
+rf.j(1.5 * m0)
+if not surrogate.trained:
+    info_red("The POD surrogate was not trained after the training runs.")
+    sys.exit(1)
+
+# Screening with the reduced model
+j_reduced = rf(m0)
+rf_full = ReducedFunctional(default_config(), scale=10**-6)
+j_full = rf_full.j(m0, annotate=False)
+rel_error = abs(j_reduced - j_full) / abs(j_full)
+info_green("Relative error of the POD surrogate: %e." % rel_error)
+if rel_error > 1e-2:
+    info_red("The functional of the POD surrogate differs from the full model (relative error %e)." % rel_error)
+    sys.exit(1)
+
+# The gradients use the full model
+p = numpy.random.rand(len(m0))
+minconv = helpers.test_gradient_array(lambda m: rf.j(m, annotate=True), rf.dj, m0, seed=0.1, perturbation_direction=p)
+if minconv < 1.9:
+    info_red("The gradient taylor remainder test failed with the POD surrogate.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,81 @@
+''' Test description:
+ - an unsteady run without turbines is spun up to the middle of the simulation and saved to disk
+ - the second half, started from the saved spin-up state, must give the same final state as the full run
+ - a configuration with a different depth must reject the spin-up state
+ - the gradient of a reduced functional that starts from the spin-up state must pass the Taylor remainder test
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+set_log_level(ERROR)
+
+
+def default_config():
+    config = DefaultConfiguration(nx=15, ny=15)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(3000, 1000, 15, 15))
+    config.params["newton_solver"] = True
+    config.params["quadratic_friction"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 0.5
+    config.params["dump_period"] = 0
+    config.params["finish_time"] = config.params["start_time"] + 10 * config.params["dt"]
+    config.params["flather_bc_expr"] = Expression(("2*eta0*sqrt(g/depth)*cos(-sqrt(g*depth)*k*t)", "0"),
+                                     eta0=2.,
+                                     g=config.params["g"],
+                                     depth=config.params["depth"],
+                                     t=config.params["current_time"],
+                                     k=pi / 3000)
+    return config
+
+# The full run
+config = default_config()
+state = Function(config.function_space)
+state.assign(config.params["initial_condition"], annotate=False)
+shallow_water_model.sw_solve(config, state, annotate=False)
+
+# The spin-up to the middle of the simulation, followed by the second half
+config = default_config()
+spin_up_time = config.params["start_time"] + 5 * config.params["dt"]
+spin_up(config, "spin_up.h5", spin_up_time)
+config.params["start_time"] = spin_up_time
+config.params["spin_up_file"] = "spin_up.h5"
+restarted_state = Function(config.function_space)
+spin_up_state.initial_state(config, restarted_state)
+shallow_water_model.sw_solve(config, restarted_state, annotate=False)
+
+error = numpy.linalg.norm(state.vector().array() - restarted_state.vector().array())
+if error > 1e-12 * numpy.linalg.norm(state.vector().array()):
+    info_red("The run started from the spin-up state does not reproduce the full run (difference %e)." % error)
+    sys.exit(1)
+
+# A different configuration must not use the spin-up state
+config_depth = default_config()
+config_depth.params["depth"] = 40.
+config_depth.params["start_time"] = spin_up_time
+config_depth.params["spin_up_file"] = "spin_up.h5"
+try:
+    spin_up_state.initial_state(config_depth, Function(config_depth.function_space))
+    info_red("The spin-up state was accepted by a different configuration.")
+    sys.exit(1)
+except ValueError:
+    pass
+
+turbine_pos = []
+border_x = config.domain.basin_x / 10
+border_y = config.domain.basin_y / 10
+for x_r in numpy.linspace(0. + border_x, config.domain.basin_x - border_x, 2):
+    for y_r in numpy.linspace(0. + border_y, config.domain.basin_y - border_y, 2):
+        turbine_pos.append((float(x_r), float(y_r)))
+config.set_turbine_pos(turbine_pos, friction=1.0)
+
+model = ReducedFunctional(config, scale=10**-6)
+m0 = model.initial_control()
+
+p = numpy.random.rand(len(m0))
+minconv = helpers.test_gradient_array(model.j, model.dj, m0, seed=0.1, perturbation_direction=p)
+if minconv < 1.9:
+    info_red("The gradient taylor remainder test failed with a spin-up state.")
+    sys.exit(1)
+else:
+    info_green("Test passed")
@@ -0,0 +1,66 @@
+''' Test description:
+ - cold-started steady state solve with advection, quadratic friction and a low viscosity
+ - the problem is solved once directly and once with diffusion coefficient continuation
+ - both solves must give the same functional value
+ - the number of Newton iterations saved by the continuation is reported and its baseline must match the direct solve
+ '''
+
+import sys
+from opentidalfarm import *
+import opentidalfarm.domains
+
+set_log_level(ERROR)
+parameters["std_out_all_processes"] = False
+
+
+def default_config(continuation_stages):
+    config = configuration.DefaultConfiguration(nx=40, ny=20)
+    config.set_domain(opentidalfarm.domains.RectangularDomain(640, 320, 40, 20))
+    config.params["steady_state"] = True
+    config.params["include_advection"] = True
+    config.params["include_diffusion"] = True
+    config.params["diffusion_coef"] = 0.5
+    config.params["quadratic_friction"] = True
+    config.params["newton_solver"] = True
+    config.params["friction"] = Constant(0.0025)
+    config.params["theta"] = 1.0
+    config.params["functional_final_time_only"] = True
+    config.params["dump_period"] = 0
+    config.params["continuation_stages"] = continuation_stages
+    config.params["continuation_parameter"] = "diffusion_coef"
+
+    bc = DirichletBCSet(config)
+    bc.add_constant_flow(1, 2.0)
+    bc.add_zero_eta(2)
+    config.params["bctype"] = "strong_dirichlet"
+    config.params["strong_bc"] = bc
+    config.params["free_slip_on_sides"] = True
+
+    config.set_site_dimensions(160, 480, 80, 240)
+    deploy_turbines(config, nx=4, ny=2)
+    config.params["controls"] = ["turbine_pos"]
+    return config
+
+functional_values = []
+newton_iterations = []
+for continuation_stages in [0, 3]:
+    config = default_config(continuation_stages)
+    # The continuation also solves the cold-started problem to report the saved iterations
+    config.params["continuation_baseline"] = continuation_stages > 0
+    rf = ReducedFunctional(config)
+    m0 = rf.initial_control()
+    functional_values.append(rf.j(m0, annotate=False))
+    baseline_iterations = rf.continuation.baseline_iterations or 0
+    newton_iterations.append(config.solver_cache.newton_iterations() - baseline_iterations)
+
+if rf.continuation.baseline_iterations != newton_iterations[0]:
+    info_red("The continuation baseline (%s Newton iterations) does not match the cold-started solve (%i)." % (rf.continuation.baseline_iterations, newton_iterations[0]))
+    sys.exit(1)
+
+info_green("Newton iterations without continuation: %i, with continuation: %i (saved: %i)." % (newton_iterations[0], newton_iterations[1], newton_iterations[0] - newton_iterations[1]))
+rel_diff = abs(functional_values[0] - functional_values[1]) / abs(functional_values[0])
+if rel_diff > 1e-8:
+    info_red("The continuation changed the functional value (relative difference %e)." % rel_diff)
+    sys.exit(1)
+else:
+    info_green("Test passed")